@@ -0,0 +1,146 @@
+"""Shared position analysis for the server.
+
+Instead of every spectator running its own Stockfish, the server runs a small
+pool of UCI engines and analyses each new position once. Results are cached
+by Zobrist hash in an LRU, so a position reached in many rooms (or again in
+the same room) costs one analysis. While a position stays on the board the
+service deepens it step by step (EVAL_DEPTHS) and pushes each result to the
+room's subscribed spectators as
+
+    eval:<ply>:<centipawns from White's view>:<depth>
+
+Mate scores are reported as +/-MATE_SCORE.
+"""
+import asyncio
+import collections
+
+import chess
+import chess.engine
+import chess.polyglot
+
+MATE_SCORE = 10000
+EVAL_DEPTHS = (8, 12, 16, 20)
+
+
+def score_to_cp(score):
+    """White-relative centipawns for a PovScore, with mates clamped to +/-MATE_SCORE."""
+    white = score.white()
+    if white.is_mate():
+        return MATE_SCORE if white.mate() > 0 else -MATE_SCORE
+    return white.score()
+
+
+class AnalysisService:
+    """Bounded engine pool plus an LRU evaluation cache shared by every room."""
+
+    def __init__(self, engine_path, pool_size=2, cache_size=100000, depths=EVAL_DEPTHS):
+        self.engine_path = engine_path
+        self.pool_size = pool_size
+        self.cache_size = cache_size
+        self.depths = tuple(sorted(depths))
+        self.cache = collections.OrderedDict()  # zobrist key -> (depth, centipawns)
+        self.inflight = {}  # (zobrist key, depth) -> Future for an analysis already running
+        self.waiters = collections.Counter()  # (zobrist key, depth) -> rooms awaiting that analysis
+        self.engines = []
+        self.idle = None  # asyncio.Queue of engines not currently analysing
+        self.stats = collections.Counter()
+
+    async def start(self):
+        """Launch the engine processes."""
+        self.idle = asyncio.Queue()
+        for _ in range(self.pool_size):
+            _, engine = await chess.engine.popen_uci(self.engine_path)
+            self.engines.append(engine)
+            self.idle.put_nowait(engine)
+        print(f"Analysis: {self.pool_size} engine(s) started from {self.engine_path}")
+
+    async def stop(self):
+        for engine in self.engines:
+            try:
+                await engine.quit()
+            except chess.engine.EngineError:
+                pass
+        self.engines = []
+
+    def lookup(self, key):
+        """Cached (depth, centipawns) for a position key, or None."""
+        entry = self.cache.get(key)
+        if entry is not None:
+            self.cache.move_to_end(key)
+        return entry
+
+    def store(self, key, depth, cp):
+        entry = self.cache.get(key)
+        if entry is not None and entry[0] >= depth:
+            return
+        self.cache[key] = (depth, cp)
+        self.cache.move_to_end(key)
+        while len(self.cache) > self.cache_size:
+            self.cache.popitem(last=False)
+
+    async def evaluate(self, board, key, depth):
+        """Return (depth, centipawns) for the position at at least `depth`, analysing it at most once."""
+        entry = self.lookup(key)
+        if entry is not None and entry[0] >= depth:
+            self.stats['cache_hits'] += 1
+            return entry
+        future = self.inflight.get((key, depth))
+        if future is None:
+            self.stats['analyses'] += 1
+            future = asyncio.ensure_future(self.run_engine(board.copy(), key, depth))
+            self.inflight[(key, depth)] = future
+            future.add_done_callback(lambda _: self.inflight.pop((key, depth), None))
+        else:
+            self.stats['shared'] += 1
+        # Shielded so a room that moves on does not cancel work other rooms wait for;
+        # the analysis is cancelled once the last room waiting for it has gone.
+        self.waiters[(key, depth)] += 1
+        try:
+            return await asyncio.shield(future)
+        finally:
+            self.waiters[(key, depth)] -= 1
+            if not self.waiters[(key, depth)]:
+                del self.waiters[(key, depth)]
+                if not future.done():
+                    self.stats['cancelled'] += 1
+                    future.cancel()
+
+    async def run_engine(self, board, key, depth):
+        engine = await self.idle.get()
+        try:
+            if not self.waiters[(key, depth)]:
+                raise asyncio.CancelledError  # Every room moved on while this waited for an engine
+            info = await engine.analyse(board, chess.engine.Limit(depth=depth))
+        finally:
+            self.idle.put_nowait(engine)
+        cp = score_to_cp(info["score"])
+        reached = info.get("depth", depth)
+        self.store(key, reached, cp)
+        return reached, cp
+
+    async def deepen(self, room, board):
+        """Publish progressively deeper evaluations of `board` to the room until the position changes.
+
+        Runs as the room's analysis task; the room cancels it when a move is made.
+        """
+        key = chess.polyglot.zobrist_hash(board)
+        ply = board.ply()
+        if board.is_game_over():
+            return
+        entry = self.lookup(key)
+        if entry is not None:
+            room.publish_eval(f"eval:{ply}:{entry[1]}:{entry[0]}")
+        for depth in self.depths:
+            if entry is not None and entry[0] >= depth:
+                continue
+            try:
+                entry = await self.evaluate(board, key, depth)
+            except chess.engine.EngineError as e:
+                print(f"Analysis failed: {e}")
+                return
+            room.publish_eval(f"eval:{ply}:{entry[1]}:{entry[0]}")
+
+    def report(self):
+        return (f"cached={len(self.cache)} analyses={self.stats['analyses']} "
+                f"cache_hits={self.stats['cache_hits']} shared={self.stats['shared']} "
+                f"cancelled={self.stats['cancelled']}")
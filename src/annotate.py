@@ -0,0 +1,251 @@
+"""Batch engine analysis of finished games.
+
+Streams a PGN file (for example the server's --pgn export) through a pool of
+worker processes, each driving its own single-threaded UCI engine, and writes
+every game back out as PGN with an evaluation comment on each move
+('[%eval 0.35]', '[%eval #-3]') and ?!, ? or ?? on inaccuracies, mistakes
+and blunders:
+
+    python annotate.py games.pgn --engine stockfish --workers 8 --depth 12 -o annotated.pgn
+
+The main process only splits the input into games at header lines and writes
+results; parsing, move replay and analysis all happen in the workers, and at
+most a few batches per worker are in flight, so memory stays flat however
+large the input is and games come out in input order as they finish.
+
+Positions that repeat across games (openings above all) are analysed once:
+the workers share an evaluation cache in shared memory, a fixed-size hash
+table indexed by Zobrist key. Each slot holds two 64-bit words, key ^ data
+and data, the lockless-hashing scheme chess engines use for their
+transposition tables: a slot torn by two workers writing at once fails the
+key check and reads as a miss, so lookups and stores need no lock and the
+workers never wait for each other.
+"""
+import argparse
+import collections
+import io
+import itertools
+import multiprocessing
+import multiprocessing.util
+import os
+import sys
+import time
+from multiprocessing import shared_memory
+
+import chess
+import chess.engine
+import chess.pgn
+import chess.polyglot
+
+MATE_VALUE = 100000  # mate in n is stored as +/-(MATE_VALUE - n)
+EVAL_CAP = 1000  # evaluations are clamped to +/- this many centipawns when measuring a move's cost
+INACCURACY, MISTAKE, BLUNDER = 50, 100, 300  # centipawns lost by the mover
+CACHE_MB = 64
+
+
+class SharedEvalCache:
+    """Evaluation hash table in shared memory, read and written by every worker without locks."""
+
+    def __init__(self, name=None, size_mb=CACHE_MB):
+        if name is None:
+            slots = 1 << max(10, (size_mb * 1024 * 1024 // 16).bit_length() - 1)
+            self.shm = shared_memory.SharedMemory(create=True, size=slots * 16)
+        else:
+            self.shm = shared_memory.SharedMemory(name=name)
+        self.table = self.shm.buf.cast('Q')  # slot i: table[2i] = key ^ data, table[2i + 1] = data
+        self.mask = len(self.table) // 2 - 1
+
+    @property
+    def name(self):
+        return self.shm.name
+
+    def get(self, key):
+        """White-relative evaluation stored for a Zobrist key, or None."""
+        i = (key & self.mask) << 1
+        data = self.table[i + 1]
+        if data and self.table[i] ^ data == key:
+            return (data & 0xffffffff) - 0x80000000
+        return None
+
+    def put(self, key, value):
+        data = (1 << 32) | (value + 0x80000000)  # bit 32 marks a used slot
+        i = (key & self.mask) << 1
+        self.table[i] = key ^ data
+        self.table[i + 1] = data
+
+    def close(self, unlink=False):
+        self.table.release()
+        self.shm.close()
+        if unlink:
+            self.shm.unlink()
+
+
+def split_games(f):
+    """Yield the raw text of each game in a PGN stream without parsing its moves.
+
+    A game ends where a header line follows movetext outside a {comment}.
+    """
+    lines = []
+    in_moves = False
+    in_comment = False
+    for line in f:
+        if line.startswith("[") and in_moves and not in_comment:
+            yield "".join(lines)
+            lines = []
+            in_moves = False
+        elif line.strip() and (in_moves or not line.startswith("[")):
+            in_moves = True
+            in_comment = comment_open(line, in_comment)
+        lines.append(line)
+    if in_moves:
+        yield "".join(lines)
+
+def comment_open(line, inside):
+    """Whether a {comment} is open at the end of `line`, given whether one was open at its start."""
+    pos = 0
+    while True:
+        pos = line.find("}" if inside else "{", pos)
+        if pos < 0:
+            return inside
+        inside = not inside
+        pos += 1
+
+def format_eval(value):
+    if abs(value) > MATE_VALUE - 1000:
+        moves = MATE_VALUE - abs(value)
+        return f"#{moves}" if value > 0 else f"#-{moves}"
+    return f"{value / 100:.2f}"
+
+def move_cost(before, after, white):
+    """Centipawns the mover gave away, with both evaluations clamped to EVAL_CAP."""
+    before = max(-EVAL_CAP, min(EVAL_CAP, before))
+    after = max(-EVAL_CAP, min(EVAL_CAP, after))
+    return before - after if white else after - before
+
+
+# Worker process state, set up by start_worker()
+engine = None
+cache = None
+limit = None
+
+def start_worker(engine_path, cache_name, depth):
+    global engine, cache, limit
+    engine = chess.engine.SimpleEngine.popen_uci(engine_path)
+    options = {name: value for name, value in (("Threads", 1), ("Hash", 16)) if name in engine.options}
+    if options:
+        engine.configure(options)
+    cache = SharedEvalCache(cache_name)
+    limit = chess.engine.Limit(depth=depth)
+    multiprocessing.util.Finalize(None, stop_worker, exitpriority=10)
+
+def stop_worker():
+    engine.quit()
+    cache.close()
+
+def evaluate(board, stats):
+    """White-relative evaluation of a position, from the game itself, the shared cache or the engine."""
+    stats['positions'] += 1
+    if board.is_checkmate():
+        return -MATE_VALUE if board.turn == chess.WHITE else MATE_VALUE
+    if board.is_stalemate() or board.is_insufficient_material():
+        return 0
+    key = chess.polyglot.zobrist_hash(board)
+    value = cache.get(key)
+    if value is not None:
+        stats['cache_hits'] += 1
+        return value
+    stats['analyses'] += 1
+    value = engine.analyse(board, limit)["score"].white().score(mate_score=MATE_VALUE)
+    cache.put(key, value)
+    return value
+
+def annotate_game(text, stats):
+    """The game in `text` as annotated PGN; unreadable games come back unchanged."""
+    game = chess.pgn.read_game(io.StringIO(text))
+    if game is None or game.errors:
+        stats['skipped'] += 1
+        return text if text.endswith("\n\n") else text.rstrip("\n") + "\n\n"
+    board = game.board()
+    before = evaluate(board, stats)
+    for node in game.mainline():
+        white = board.turn == chess.WHITE
+        board.push(node.move)
+        after = evaluate(board, stats)
+        stats['moves'] += 1
+        if not board.is_checkmate():
+            node.comment = f"[%eval {format_eval(after)}] {node.comment}".rstrip()
+        cost = move_cost(before, after, white)
+        if cost >= BLUNDER:
+            node.nags.add(chess.pgn.NAG_BLUNDER)
+            stats['blunders'] += 1
+        elif cost >= MISTAKE:
+            node.nags.add(chess.pgn.NAG_MISTAKE)
+            stats['mistakes'] += 1
+        elif cost >= INACCURACY:
+            node.nags.add(chess.pgn.NAG_DUBIOUS_MOVE)
+            stats['inaccuracies'] += 1
+        before = after
+    stats['games'] += 1
+    return str(game) + "\n\n"
+
+def annotate_batch(texts):
+    """Worker entry point: annotate a batch of games; returns (PGN text, stats)."""
+    stats = collections.Counter()
+    return "".join(annotate_game(text, stats) for text in texts), stats
+
+def batches(iterable, size):
+    iterator = iter(iterable)
+    while batch := list(itertools.islice(iterator, size)):
+        yield batch
+
+def report(stats, elapsed):
+    positions = stats['positions'] or 1
+    print(f"{stats['games']} games ({stats['skipped']} skipped), {stats['moves']} moves in {elapsed:.1f}s "
+          f"({stats['games'] / elapsed:.1f} games/s)", file=sys.stderr)
+    print(f"Positions: {stats['positions']}, cache hits {stats['cache_hits']} "
+          f"({100 * stats['cache_hits'] / positions:.1f}%), engine analyses {stats['analyses']}", file=sys.stderr)
+    print(f"Blunders {stats['blunders']}, mistakes {stats['mistakes']}, "
+          f"inaccuracies {stats['inaccuracies']}", file=sys.stderr)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("pgn", help="PGN file to analyse ('-' for standard input)")
+    parser.add_argument("-o", "--output", help="annotated PGN output (default: standard output)")
+    parser.add_argument("--engine", default=os.environ.get("STOCKFISH_PATH", "stockfish"),
+                        help="UCI engine to run in each worker (default: $STOCKFISH_PATH or stockfish)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(),
+                        help="worker processes, one engine each (default: one per core)")
+    parser.add_argument("--depth", type=int, default=12, help="search depth per position (default: %(default)s)")
+    parser.add_argument("--cache-mb", type=int, default=CACHE_MB,
+                        help="size of the shared evaluation cache (default: %(default)s)")
+    parser.add_argument("--batch", type=int, default=8, help="games per worker task (default: %(default)s)")
+    args = parser.parse_args()
+
+    source = sys.stdin if args.pgn == "-" else open(args.pgn, encoding="utf-8", errors="replace")
+    out = open(args.output, "w", encoding="utf-8") if args.output else sys.stdout
+    shared = SharedEvalCache(size_mb=args.cache_mb)
+    stats = collections.Counter()
+    start = time.perf_counter()
+    try:
+        with multiprocessing.Pool(args.workers, start_worker, (args.engine, shared.name, args.depth)) as pool:
+            pending = collections.deque()  # Batches in flight, in input order
+            for batch in batches(split_games(source), args.batch):
+                pending.append(pool.apply_async(annotate_batch, (batch,)))
+                if len(pending) >= 4 * args.workers:
+                    text, batch_stats = pending.popleft().get()
+                    out.write(text)
+                    stats.update(batch_stats)
+            while pending:
+                text, batch_stats = pending.popleft().get()
+                out.write(text)
+                stats.update(batch_stats)
+            pool.close()
+            pool.join()  # Lets the workers quit their engines
+    finally:
+        shared.close(unlink=True)
+        if out is not sys.stdout:
+            out.close()
+    report(stats, time.perf_counter() - start)
+
+if __name__ == "__main__":
+    main()
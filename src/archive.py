@@ -0,0 +1,83 @@
+"""Compact store for finished games.
+
+A live room keeps a full chess.Board whose move stack holds a Move object and
+a board-state snapshot per ply. Once a game ends none of that is needed until
+someone looks at the game again, so the server archives it as an
+ArchivedGame: the moves packed 16 bits each into an array('H') (the journal's
+move encoding) plus a few header fields in a __slots__ record. The board is
+only rebuilt, by replaying the moves, when the game is opened.
+"""
+import array
+import itertools
+import time
+
+import chess
+
+from journal import decode_move, encode_move
+
+ARCHIVE_SIZE = 100000  # finished games kept in memory
+
+
+class ArchivedGame:
+    """One finished game: header fields plus packed moves."""
+
+    __slots__ = ("game_id", "room_id", "white", "black", "time_control", "result",
+                 "ended", "white_ms", "black_ms", "moves")
+
+    def __init__(self, game_id, room_id, white, black, time_control, result, clocks, moves):
+        self.game_id = game_id
+        self.room_id = room_id
+        self.white = white  # player names, None if the seat was never taken
+        self.black = black
+        self.time_control = time_control  # TimeControl string
+        self.result = result  # as announced in "Game over: ..."
+        self.ended = time.time()
+        self.white_ms, self.black_ms = clocks
+        self.moves = moves  # array('H') of encoded moves
+
+    @classmethod
+    def from_board(cls, game_id, room_id, white, black, time_control, result, clocks, board):
+        moves = array.array('H', (encode_move(move) for move in board.move_stack))
+        return cls(game_id, room_id, white, black, time_control, result, clocks, moves)
+
+    def __len__(self):
+        return len(self.moves)
+
+    def board(self):
+        """Re-materialize the final position (with its move stack) by replaying the moves."""
+        board = chess.Board()
+        for code in self.moves:
+            board.push(decode_move(code))
+        return board
+
+
+class GameArchive:
+    """Most recent finished games, by game id and by the room they were played in."""
+
+    def __init__(self, size=ARCHIVE_SIZE):
+        self.size = size
+        self.games = {}    # game id -> ArchivedGame, oldest first
+        self.by_room = {}  # room id -> id of the last game finished there
+        self.ids = itertools.count(1)
+
+    def add(self, room_id, white, black, time_control, result, clocks, board):
+        game = ArchivedGame.from_board(next(self.ids), room_id, white, black,
+                                       time_control, result, clocks, board)
+        self.games[game.game_id] = game
+        self.by_room[room_id] = game.game_id
+        while len(self.games) > self.size:
+            old = self.games.pop(next(iter(self.games)))
+            if self.by_room.get(old.room_id) == old.game_id:
+                del self.by_room[old.room_id]
+        return game
+
+    def get(self, game_id):
+        return self.games.get(game_id)
+
+    def last_in_room(self, room_id):
+        """The last game finished in a room, or None."""
+        game_id = self.by_room.get(room_id)
+        return self.games.get(game_id) if game_id is not None else None
+
+    def __len__(self):
+        return len(self.games)
@@ -0,0 +1,81 @@
+"""Memory benchmark for the finished-game archive.
+
+Plays random games, then measures the memory held per game when each is kept
+as a live chess.Board (with its move stack) and when it is kept as an
+ArchivedGame, and how long re-materializing an archived board takes.
+
+    python bench_archive.py --games 2000 --plies 80
+"""
+import argparse
+import gc
+import random
+import time
+import tracemalloc
+
+import chess
+
+from archive import GameArchive
+
+
+def random_game(rng, plies):
+    board = chess.Board()
+    while board.ply() < plies and not board.is_game_over():
+        board.push(rng.choice(list(board.legal_moves)))
+    return board
+
+def measure(build):
+    """Bytes still allocated by the object build() returns."""
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    kept = build()
+    gc.collect()
+    used = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    return kept, used
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--games", type=int, default=2000)
+    parser.add_argument("--plies", type=int, default=80, help="maximum plies per game")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    print(f"Playing {args.games} random games of up to {args.plies} plies...")
+    ucis = []
+    for _ in range(args.games):
+        ucis.append([move.uci() for move in random_game(rng, args.plies).move_stack])
+    plies = sum(len(game) for game in ucis)
+    print(f"  {plies / args.games:.1f} plies per game on average")
+
+    def live_boards():
+        boards = []
+        for game in ucis:
+            board = chess.Board()
+            for uci in game:
+                board.push_uci(uci)
+            boards.append(board)
+        return boards
+
+    boards, live = measure(live_boards)
+
+    def archived():
+        archive = GameArchive(size=len(boards))
+        for i, board in enumerate(boards):
+            archive.add(f"room{i}", "white", "black", "600", "White wins", (600000, 600000), board)
+        return archive
+
+    archive, packed = measure(archived)
+    print(f"Live chess.Board:  {live / args.games:8.0f} bytes/game")
+    print(f"ArchivedGame:      {packed / args.games:8.0f} bytes/game "
+          f"({live / packed:.1f}x smaller)")
+
+    start = time.perf_counter()
+    for game in archive.games.values():
+        game.board()
+    elapsed = time.perf_counter() - start
+    print(f"Re-materializing:  {elapsed / len(archive) * 1e6:8.0f} us/game")
+
+if __name__ == "__main__":
+    main()
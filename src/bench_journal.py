@@ -0,0 +1,116 @@
+"""Benchmark for the game journal.
+
+Measures journaled move throughput with group commit (compared with an fsync
+per move), then builds a journal of many games and times recovery from the
+raw segments and from a snapshot.
+
+    python bench_journal.py --games 100000 --plies 40 --rooms 200 --duration 5
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+import chess
+
+from journal import Journal, encode_move, move_record
+
+# Legal in any order from the start position, so recovered games replay cleanly.
+SHUFFLE = [chess.Move.from_uci(uci) for uci in ("g1f3", "g8f6", "f3g1", "f6g8")]
+
+
+async def play(journal, game_no, deadline, counts):
+    """One room making moves as fast as the event loop schedules it."""
+    ply = 0
+    while time.perf_counter() < deadline:
+        journal.record_move(game_no, SHUFFLE[ply % 4], (600000 - ply, 600000 - ply))
+        ply += 1
+        counts[0] += 1
+        await asyncio.sleep(0)
+
+async def throughput(directory, rooms, duration, commit_interval):
+    journal = Journal(directory, commit_interval, snapshot_interval=0)
+    journal.recover()
+    await journal.open(lambda: [])
+    games = [journal.start_game(f"room{i}", "600") for i in range(rooms)]
+    counts = [0]
+    start = time.perf_counter()
+    await asyncio.gather(*(play(journal, g, start + duration, counts) for g in games))
+    await journal.close()
+    elapsed = time.perf_counter() - start
+    return counts[0] / elapsed, journal.stats['commits'] / elapsed
+
+def fsync_per_move(directory, duration):
+    """Baseline: write and fsync each move record on its own."""
+    os.makedirs(directory, exist_ok=True)
+    moves = 0
+    start = time.perf_counter()
+    with open(os.path.join(directory, "baseline.log"), "ab") as f:
+        while time.perf_counter() - start < duration:
+            Journal.write_and_sync(f, move_record(1, encode_move(SHUFFLE[moves % 4]), (600000, 600000)))
+            moves += 1
+    return moves / (time.perf_counter() - start)
+
+async def build(directory, games, plies):
+    """Journal `games` complete-length games (left unfinished) without any later snapshot."""
+    journal = Journal(directory, snapshot_interval=0)
+    journal.recover()
+    await journal.open(lambda: [])
+    for i in range(games):
+        game_no = journal.start_game(f"room{i}", "600")
+        for ply in range(plies):
+            journal.record_move(game_no, SHUFFLE[ply % 4], (600000 - ply, 600000 - ply))
+        if i % 1000 == 999:
+            await journal.commit()
+    await journal.close()
+
+def timed_recover(directory):
+    start = time.perf_counter()
+    games = Journal(directory).recover()
+    return games, time.perf_counter() - start
+
+async def snapshot(directory, games):
+    journal = Journal(directory, snapshot_interval=0)
+    journal.recover()
+    await journal.open(lambda: list(games.values()))
+    await journal.close()
+
+def disk_usage(directory):
+    return sum(os.path.getsize(os.path.join(directory, name)) for name in os.listdir(directory))
+
+async def run(args):
+    with tempfile.TemporaryDirectory(dir=args.dir) as directory:
+        moves = fsync_per_move(os.path.join(directory, "baseline"), args.duration)
+        print(f"fsync per move: {moves:,.0f} moves/s")
+        moves, commits = await throughput(os.path.join(directory, "group"), args.rooms,
+                                          args.duration, args.commit_interval)
+        print(f"Group commit:   {moves:,.0f} moves/s, {commits:,.0f} fsyncs/s "
+              f"({args.rooms} rooms, commit interval {args.commit_interval * 1000:g}ms)")
+
+        sub = os.path.join(directory, "recovery")
+        print(f"Journaling {args.games:,} games of {args.plies} plies...")
+        start = time.perf_counter()
+        await build(sub, args.games, args.plies)
+        print(f"  written in {time.perf_counter() - start:.1f}s, {disk_usage(sub) / 2**20:.1f} MiB on disk")
+
+        games, elapsed = timed_recover(sub)
+        print(f"Recovery by replaying segments: {len(games):,} games in {elapsed:.2f}s")
+        await snapshot(sub, games)
+        games, elapsed = timed_recover(sub)
+        print(f"Recovery from snapshot:         {len(games):,} games in {elapsed:.2f}s "
+              f"({disk_usage(sub) / 2**20:.1f} MiB on disk)")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--games", type=int, default=100000, help="games in the recovery test")
+    parser.add_argument("--plies", type=int, default=40, help="moves per game in the recovery test")
+    parser.add_argument("--rooms", type=int, default=200, help="concurrent rooms in the throughput test")
+    parser.add_argument("--duration", type=float, default=5.0, help="seconds per throughput run")
+    parser.add_argument("--commit-interval", type=float, default=0.005)
+    parser.add_argument("--dir", help="where to create the scratch journal (default: system temp dir)")
+    args = parser.parse_args()
+    asyncio.run(run(args))
+
+if __name__ == "__main__":
+    main()
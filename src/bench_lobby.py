@@ -0,0 +1,127 @@
+"""Load generator for the matchmaking lobby.
+
+Starts server.py on localhost and sends it a stream of seekers with random
+ratings and time controls. Some of them give up before they are paired. It
+reports the join/leave rate the server sustained and the pairing latency:
+how long a seeker that found an opponent at once waited for its seat (server
+cost only), and how long the seekers that had to queue waited.
+
+    python bench_lobby.py --rate 2000 --duration 10 --cancel 0.2
+"""
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import subprocess
+import sys
+import time
+
+import server
+from bench_server import server_rss_kib
+from headless import HeadlessClient
+
+TIME_CONTROLS = ("60", "180+2", "300", "600")
+
+
+async def seek(host, port, name, rating, time_control, patience, results):
+    """One seeker: join the lobby, wait to be paired (or give up), play the first move, then leave."""
+    try:
+        reader, writer = await asyncio.open_connection(host, port)
+    except OSError:
+        results['refused'] += 1
+        return
+    client = HeadlessClient(reader, writer)
+    try:
+        for answer in (name, "lobby", f"m:{rating}:{time_control}"):
+            await client.recv()  # prompt
+            client.send(answer)
+        start = time.perf_counter()
+        reply = await client.recv()
+        if reply.startswith("Matched"):
+            results['immediate'].append(time.perf_counter() - start)
+        elif reply == "Waiting for an opponent":
+            try:
+                await asyncio.wait_for(client.wait_for("Matched"), patience)
+                results['queued'].append(time.perf_counter() - start)
+            except asyncio.TimeoutError:
+                client.send("cancel")
+                results['cancelled'] += 1
+                return
+        # Both players stay until White's first move has reached them, so a
+        # seat that cannot be played from after pairing shows up as an error.
+        await client.wait_for("You are ")
+        if client.color == 'white':
+            client.send("e2e4")
+        await asyncio.wait_for(client.wait_for("move:1:"), 10)
+    except (ConnectionError, asyncio.TimeoutError):
+        results['errors'] += 1
+    finally:
+        client.close()
+
+def percentiles(samples):
+    ms = sorted(x * 1000 for x in samples)
+    return f"p50={statistics.median(ms):.2f}ms p99={ms[int(len(ms) * 0.99) - 1]:.2f}ms max={ms[-1]:.2f}ms"
+
+async def run(args):
+    host, port = "127.0.0.1", args.port
+    proc = subprocess.Popen([sys.executable, os.path.join(os.path.dirname(__file__), "server.py"),
+                             "--host", host, "--port", str(port), "--resume-grace", "0",
+                             "--match-window", str(args.window)],
+                            stdout=subprocess.DEVNULL)
+    if hasattr(os, "sched_setaffinity"):
+        os.sched_setaffinity(proc.pid, {0})
+    rng = random.Random(args.seed)
+    results = {'immediate': [], 'queued': [], 'cancelled': 0, 'errors': 0, 'refused': 0}
+    try:
+        await asyncio.sleep(1.0)
+        print(f"Sending {args.rate} seekers/s for {args.duration}s...")
+        tasks = set()
+        sent = 0
+        start = time.perf_counter()
+        while time.perf_counter() - start < args.duration:
+            due = int((time.perf_counter() - start) * args.rate)
+            for _ in range(due - sent):
+                rating = max(0, int(rng.gauss(1500, 300)))
+                patience = rng.uniform(0, 2) if rng.random() < args.cancel else 30
+                task = asyncio.create_task(seek(host, port, f"p{sent}", rating,
+                                                rng.choice(TIME_CONTROLS), patience, results))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+                sent += 1
+            await asyncio.sleep(0.01)
+        elapsed = time.perf_counter() - start
+        rss = server_rss_kib(proc.pid)
+        for task in list(tasks):
+            task.cancel()  # Seekers still waiting when the run ends
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+        paired = len(results['immediate']) + len(results['queued'])
+        events = sent + results['cancelled']
+        print(f"Seekers: {sent} ({sent / elapsed:.0f}/s), paired {paired}, gave up {results['cancelled']}, "
+              f"errors {results['errors'] + results['refused']}")
+        print(f"Lobby events (joins + leaves): {events / elapsed:.0f}/s")
+        if results['immediate']:
+            print(f"Paired on arrival: {percentiles(results['immediate'])}")
+        if results['queued']:
+            print(f"Paired after queueing: {percentiles(results['queued'])}")
+        if rss is not None:
+            print(f"Server RSS: {rss / 1024:.1f} MiB")
+    finally:
+        proc.terminate()
+        proc.wait()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rate", type=int, default=2000, help="new seekers per second")
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds of load")
+    parser.add_argument("--cancel", type=float, default=0.2, help="fraction of seekers that give up early")
+    parser.add_argument("--window", type=int, default=200, help="server --match-window")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--port", type=int, default=5603)
+    args = parser.parse_args()
+    server.raise_fd_limit()
+    asyncio.run(run(args))
+
+if __name__ == "__main__":
+    main()
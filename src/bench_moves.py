@@ -0,0 +1,84 @@
+"""Microbenchmark for server-side move validation.
+
+Replays random games through three versions of the move path (without the
+network, clocks or broadcast) and reports validated moves per second on one
+core:
+
+  before  Move.from_uci, `move in board.legal_moves`, board.is_game_over()
+  after   GameRoom.legal_move / push / game_result
+  hints   the same with --legal-hints: one generated move set per position
+          serves validation, the game-over check and the hint message
+
+    python bench_moves.py --games 500
+"""
+import argparse
+import random
+import time
+
+import chess
+
+from server import GameRoom
+
+
+def random_games(count, max_plies, seed):
+    rng = random.Random(seed)
+    games = []
+    for _ in range(count):
+        board = chess.Board()
+        while not board.is_game_over() and board.ply() < max_plies:
+            board.push(rng.choice(list(board.legal_moves)))
+        games.append([move.uci() for move in board.move_stack])
+    return games
+
+def before(games):
+    results = []
+    for game in games:
+        board = chess.Board()
+        for uci in game:
+            move = chess.Move.from_uci(uci)
+            if move not in board.legal_moves:
+                raise AssertionError(uci)
+            board.push(move)
+            results.append(board.is_game_over())
+    return results
+
+def after(games, hints=False):
+    results = []
+    for game in games:
+        room = GameRoom("bench")
+        for uci in game:
+            move = room.legal_move(uci)
+            if move is None:
+                raise AssertionError(uci)
+            room.push(move)
+            if hints:
+                room.legal_hint()
+            results.append(room.game_result() is not None)
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--games", type=int, default=500)
+    parser.add_argument("--plies", type=int, default=200, help="maximum plies per game")
+    parser.add_argument("--rounds", type=int, default=3, help="best of N runs")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    games = random_games(args.games, args.plies, args.seed)
+    moves = sum(len(game) for game in games)
+    print(f"{args.games} random games, {moves} moves")
+    expected = before(games)
+    runs = (("before", before), ("after", after), ("hints", lambda g: after(g, hints=True)))
+    for name, run in runs:
+        best = None
+        for _ in range(args.rounds):
+            start = time.perf_counter()
+            results = run(games)
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        if results != expected:
+            raise AssertionError(f"{name}: game-over detection differs from board.is_game_over()")
+        print(f"{name:>7}: {moves / best:10,.0f} validated moves/s")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+"""Fan-out benchmark for spectator relays.
+
+Starts a game server and a number of relay processes on localhost, spreads
+spectators of one hot game evenly over the relays (or connects them all
+directly with --relays 0), plays a long game and reports how long each move
+takes to reach the spectators. Give each process its own core to see the
+relays spread the fan-out work.
+
+    python bench_relay.py --spectators 2000 --relays 4
+    python bench_relay.py --spectators 2000 --relays 0
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+import chess
+
+import server
+from headless import connect
+
+ROOM = "bench-hot"
+
+
+def long_game():
+    """A legal game of 112 plies that never repeats a position five times.
+
+    Each pawn push gives a new position; the knight shuffles in between
+    return to it three times, well short of fivefold repetition.
+    """
+    board = chess.Board()
+    moves = []
+    for file in "abcdefgh":
+        for uci in (f"{file}2{file}4", f"{file}7{file}5") + ("g1f3", "g8f6", "f3g1", "f6g8") * 3:
+            board.push_uci(uci)
+            moves.append(uci)
+    return moves
+
+def start_server(script_args, core):
+    proc = subprocess.Popen([sys.executable, os.path.join(os.path.dirname(__file__), "server.py")] + script_args,
+                            stdout=subprocess.DEVNULL)
+    if hasattr(os, "sched_setaffinity"):
+        cores = sorted(os.sched_getaffinity(0))
+        os.sched_setaffinity(proc.pid, {cores[core % len(cores)]})
+    return proc
+
+async def spectate(client, arrivals):
+    """Record when each move delta arrives until the game ends."""
+    try:
+        while True:
+            message = await client.recv()
+            if message.startswith("move:"):
+                arrivals.setdefault(int(message.split(":")[1]), []).append(time.perf_counter())
+            elif message.startswith("Game over:"):
+                return
+    except ConnectionError:
+        pass
+
+async def run(args):
+    host = "127.0.0.1"
+    procs = [start_server(["--host", host, "--port", str(args.port)], 0)]
+    ports = [args.port]
+    if args.relays:
+        ports = [args.port + 1 + i for i in range(args.relays)]
+        procs += [start_server(["--host", host, "--port", str(port), "--relay", f"{host}:{args.port}"], 1 + i)
+                  for i, port in enumerate(ports)]
+    try:
+        await asyncio.sleep(1.0)
+        white = await connect(host, args.port, "white", ROOM, "p")
+        black = await connect(host, args.port, "black", ROOM, "p")
+
+        print(f"Connecting {args.spectators} spectators to {len(ports)} "
+              f"{'relay(s)' if args.relays else 'game server'}...")
+        spectators = []
+        for batch in range(0, args.spectators, 500):
+            spectators += await asyncio.gather(*(
+                connect(host, ports[i % len(ports)], f"s{i}", ROOM, "s")
+                for i in range(batch, min(batch + 500, args.spectators))))
+        arrivals = {}  # ply -> arrival times at the spectators
+        tasks = [asyncio.create_task(spectate(c, arrivals)) for c in spectators]
+        await asyncio.sleep(1.0)  # Let the relays finish their upstream handshakes
+
+        sent = {}
+        board = chess.Board()
+        sides = {chess.WHITE: white, chess.BLACK: black}
+        for uci in long_game():
+            mover = board.turn
+            board.push_uci(uci)
+            sent[board.ply()] = time.perf_counter()
+            sides[mover].send(uci)
+            await asyncio.sleep(args.interval)
+        await asyncio.wait(tasks, timeout=10)
+
+        p50, p99, last = [], [], []
+        for ply, start in sent.items():
+            times = sorted((t - start) * 1000 for t in arrivals.get(ply, []))
+            if len(times) < args.spectators:
+                continue  # Some spectator never saw this move
+            p50.append(statistics.median(times))
+            p99.append(times[int(len(times) * 0.99) - 1])
+            last.append(times[-1])
+        print(f"Moves seen by every spectator: {len(last)}/{len(sent)}")
+        if last:
+            print(f"Fan-out per move (ms, median over moves): p50={statistics.median(p50):.1f} "
+                  f"p99={statistics.median(p99):.1f} last={statistics.median(last):.1f}")
+        fed = 2 + (args.relays or args.spectators)
+        print(f"Game server writes each move to {fed} sockets")
+
+        for client in spectators + [white, black]:
+            client.close()
+    finally:
+        for proc in procs:
+            proc.terminate()
+            proc.wait()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--spectators", type=int, default=2000)
+    parser.add_argument("--relays", type=int, default=4, help="relay processes (0 = connect spectators directly)")
+    parser.add_argument("--interval", type=float, default=0.05, help="seconds between moves")
+    parser.add_argument("--port", type=int, default=5620, help="game server port; relays use the ports after it")
+    args = parser.parse_args()
+    server.raise_fd_limit()
+    asyncio.run(run(args))
+
+if __name__ == "__main__":
+    main()
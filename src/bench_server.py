@@ -0,0 +1,138 @@
+"""Load benchmark for the asyncio server.
+
+Starts server.py on localhost (pinned to one core where supported), parks a
+large number of idle spectators in one room, then has several pairs of players
+play short games as fast as the server lets them and reports move throughput
+and round-trip latency while the spectators stay connected.
+
+    python bench_server.py --spectators 10000 --rooms 8 --duration 10
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+import chess
+
+import server
+from headless import connect
+
+# Knight shuffle: after four cycles the start position has occurred five
+# times, so the server ends each game by fivefold repetition after 16 plies.
+SHUFFLE = ["g1f3", "g8f6", "f3g1", "f6g8"] * 4
+
+
+async def idle_spectator(reader):
+    """Drain everything the server sends until the connection closes."""
+    try:
+        while await reader.read(65536):
+            pass
+    except ConnectionError:
+        pass
+
+async def play_games(host, port, pair_id, deadline, latencies):
+    """Play knight-shuffle games back to back in fresh rooms until the deadline."""
+    game = 0
+    moves = 0
+    while time.perf_counter() < deadline:
+        room_id = f"bench-{pair_id}-{game}"
+        white = await connect(host, port, f"w{pair_id}", room_id, "p")
+        black = await connect(host, port, f"b{pair_id}", room_id, "p")
+        sides = {chess.WHITE: white, chess.BLACK: black}
+        board = chess.Board()
+        for uci in SHUFFLE:
+            if time.perf_counter() >= deadline:
+                break
+            mover = board.turn
+            board.push_uci(uci)
+            delta = f"move:{board.ply()}:{uci}:"
+            start = time.perf_counter()
+            sides[mover].send(uci)
+            await sides[mover].wait_for(delta)
+            latencies.append(time.perf_counter() - start)
+            moves += 1
+            # Let the opponent consume the same broadcast before it replies.
+            await sides[not mover].wait_for(delta)
+        for client in sides.values():
+            client.close()
+        game += 1
+    return moves
+
+def server_rss_kib(pid):
+    """Resident set size of a process in KiB, or None where /proc is missing."""
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1])
+    except OSError:
+        return None
+    return None
+
+async def run(args):
+    host, port = "127.0.0.1", args.port
+    proc = subprocess.Popen([sys.executable, os.path.join(os.path.dirname(__file__), "server.py"),
+                             "--host", host, "--port", str(port)],
+                            stdout=subprocess.DEVNULL)
+    if hasattr(os, "sched_setaffinity"):
+        os.sched_setaffinity(proc.pid, {0})
+    try:
+        await asyncio.sleep(1.0)
+        rss_before = server_rss_kib(proc.pid)
+
+        print(f"Connecting {args.spectators} idle spectators...")
+        start = time.perf_counter()
+        idle = []
+        for batch in range(0, args.spectators, 500):
+            conns = await asyncio.gather(*(
+                connect(host, port, f"s{i}", "bench-idle", "s")
+                for i in range(batch, min(batch + 500, args.spectators))))
+            idle.extend(conns)
+        tasks = [asyncio.create_task(idle_spectator(c.reader)) for c in idle]
+        print(f"  connected in {time.perf_counter() - start:.1f}s")
+        rss_after = server_rss_kib(proc.pid)
+
+        print(f"Playing in {args.rooms} rooms for {args.duration}s...")
+        latencies = []
+        deadline = time.perf_counter() + args.duration
+        start = time.perf_counter()
+        moves = await asyncio.gather(*(play_games(host, port, i, deadline, latencies)
+                                       for i in range(args.rooms)))
+        elapsed = time.perf_counter() - start
+
+        alive = sum(1 for t in tasks if not t.done())
+        total = sum(moves)
+        print(f"Spectators still connected: {alive}/{args.spectators}")
+        print(f"Moves: {total} in {elapsed:.1f}s = {total / elapsed:.0f} moves/s")
+        if latencies:
+            latencies.sort()
+            ms = [x * 1000 for x in latencies]
+            print(f"Move round trip: p50={statistics.median(ms):.2f}ms "
+                  f"p99={ms[int(len(ms) * 0.99) - 1]:.2f}ms max={ms[-1]:.2f}ms")
+        if rss_before is not None and rss_after is not None and args.spectators:
+            print(f"Server RSS: {rss_after / 1024:.1f} MiB "
+                  f"({(rss_after - rss_before) * 1024 / args.spectators:.0f} bytes/spectator)")
+
+        for client in idle:
+            client.close()
+        for t in tasks:
+            t.cancel()
+    finally:
+        proc.terminate()
+        proc.wait()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--spectators", type=int, default=10000)
+    parser.add_argument("--rooms", type=int, default=8, help="concurrent games")
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds of play")
+    parser.add_argument("--port", type=int, default=5601)
+    args = parser.parse_args()
+    server.raise_fd_limit()
+    asyncio.run(run(args))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,50 @@
+"""Client startup cost of the piece sprites.
+
+Times getting all twelve pieces at one square size three ways (PIL images
+only, so no display is needed):
+
+  before  decode every source PNG and scale it with LANCZOS, as each launch did
+  cold    first launch: build every atlas size from the sources and save them
+  warm    any later launch: read one atlas strip from the cache
+
+    python bench_sprites.py --size 50
+"""
+import argparse
+import tempfile
+import time
+
+from PIL import Image
+
+from board_canvas import PIECE_DIR, PIECES, SpriteCache, piece_path
+
+
+def before(size):
+    tiles = {}
+    for symbol in PIECES:
+        image = Image.open(piece_path(PIECE_DIR, symbol))
+        tiles[symbol] = image.resize((size, size), Image.LANCZOS)
+    return tiles
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--size", type=int, default=50, help="square size in pixels")
+    parser.add_argument("--rounds", type=int, default=5, help="best of N warm loads")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    before(args.size)
+    print(f" before: {time.perf_counter() - start:8.3f}s")
+    with tempfile.TemporaryDirectory() as cache_dir:
+        start = time.perf_counter()
+        SpriteCache(cache_dir=cache_dir).preload(args.size).result()
+        print(f"   cold: {time.perf_counter() - start:8.3f}s")
+        best = None
+        for _ in range(args.rounds):
+            start = time.perf_counter()
+            SpriteCache(cache_dir=cache_dir).preload(args.size).result()
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        print(f"   warm: {best:8.3f}s")
+
+if __name__ == "__main__":
+    main()
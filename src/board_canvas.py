@@ -0,0 +1,231 @@
+"""Canvas-based chess board shared by the player window and the multi-board wall.
+
+A board is one tk.Canvas holding 64 square rectangles and one image item per
+piece. Updates only touch the items for squares whose piece changed. Piece
+sprites come from a SpriteCache that every board in the process shares.
+
+The piece images in chesspng are large, and decoding and scaling them took
+seconds on every launch. They are now scaled once, on first use, into a
+sprite atlas per square size: one PNG strip holding all twelve pieces, kept
+in CACHE_DIR. Every ATLAS_SIZES strip is built in the same pass, so each
+source image is decoded once. Later launches read one small strip in a few
+milliseconds. Strips load on a background thread (preload()), so this can
+overlap the connection handshake; only the PhotoImages are made on the Tk
+thread, when a piece is first drawn.
+"""
+import concurrent.futures
+import os
+import tkinter as tk
+import zlib
+
+import chess
+from PIL import Image, ImageTk  # Pillow for image resizing
+
+PIECE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "chesspng")
+CACHE_DIR = os.path.join(os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache"),
+                         "multiplayer-chess")
+ATLAS_SIZES = (24, 32, 40, 50, 64, 80, 128)  # square sizes built together on first use
+PIECES = "PNBRQKpnbrqk"  # order of the sprites in an atlas strip
+LIGHT_SQUARE = "white"
+DARK_SQUARE = "gray"
+HIGHLIGHT = "#f6f669"
+
+
+def piece_path(piece_dir, symbol):
+    prefix = "w" if symbol.isupper() else "b"
+    return os.path.join(piece_dir, f"{prefix}{symbol.upper()}.png")
+
+def source_stamp(piece_dir):
+    """Short hash of the source images' sizes and mtimes; a changed image gets new atlas files."""
+    stamp = 0
+    for symbol in PIECES:
+        info = os.stat(piece_path(piece_dir, symbol))
+        stamp = zlib.crc32(f"{symbol}:{info.st_size}:{info.st_mtime_ns}".encode(), stamp)
+    return f"{stamp:08x}"
+
+def scale_piece(path, sizes):
+    """Decode one source image and return {size: image} for every size."""
+    image = Image.open(path)
+    image.load()
+    largest = max(sizes)
+    factor = min(image.width, image.height) // (2 * largest)
+    if factor > 1:
+        image = image.reduce(factor)  # Cheap box filter down to 2x the largest size; LANCZOS does the rest
+    return {size: image.resize((size, size), Image.LANCZOS) for size in sizes}
+
+def build_atlases(piece_dir, sizes):
+    """{size: RGBA strip of the twelve pieces}; the sources are decoded in parallel."""
+    with concurrent.futures.ThreadPoolExecutor(max_workers=min(len(PIECES), os.cpu_count() or 1)) as pool:
+        scaled = list(pool.map(lambda symbol: scale_piece(piece_path(piece_dir, symbol), sizes), PIECES))
+    atlases = {}
+    for size in sizes:
+        strip = Image.new("RGBA", (size * len(PIECES), size))
+        for index, images in enumerate(scaled):
+            strip.paste(images[size], (index * size, 0))
+        atlases[size] = strip
+    return atlases
+
+
+class SpriteCache:
+    """Piece images per square size, from the on-disk atlas (built on first use)."""
+
+    def __init__(self, piece_dir=PIECE_DIR, cache_dir=CACHE_DIR):
+        self.piece_dir = piece_dir
+        self.cache_dir = cache_dir
+        self.stamp = None
+        self.tiles = {}  # size -> Future of {piece symbol: PIL image}
+        self.scaled = {}  # (piece symbol, size) -> PhotoImage
+        self.loader = concurrent.futures.ThreadPoolExecutor(max_workers=1, thread_name_prefix="sprites")
+
+    def atlas_path(self, size):
+        return os.path.join(self.cache_dir, f"sprites-{self.stamp}-{size}.png")
+
+    def preload(self, size):
+        """Start loading the sprites for one square size in the background; returns the Future."""
+        future = self.tiles.get(size)
+        if future is None:
+            future = self.tiles[size] = self.loader.submit(self.load, size)
+        return future
+
+    def load(self, size):
+        """Loader thread: the atlas strip for `size` cut into one image per piece."""
+        if self.stamp is None:
+            self.stamp = source_stamp(self.piece_dir)
+        try:
+            strip = Image.open(self.atlas_path(size))
+            strip.load()
+        except OSError:
+            strip = self.build(size)
+        return {symbol: strip.crop((index * size, 0, (index + 1) * size, size))
+                for index, symbol in enumerate(PIECES)}
+
+    def build(self, size):
+        """Make the atlas for `size` (and any missing standard sizes) and save what was made."""
+        larger = [s for s in ATLAS_SIZES if s >= size]
+        if larger and os.path.exists(self.atlas_path(larger[0])):
+            # Off-size boards (the wall) scale down from the nearest standard strip.
+            source = Image.open(self.atlas_path(larger[0]))
+            strip = Image.new("RGBA", (size * len(PIECES), size))
+            for index in range(len(PIECES)):
+                tile = source.crop((index * larger[0], 0, (index + 1) * larger[0], larger[0]))
+                strip.paste(tile.resize((size, size), Image.LANCZOS), (index * size, 0))
+            atlases = {size: strip}
+        elif larger:
+            atlases = build_atlases(self.piece_dir, sorted(set(ATLAS_SIZES) | {size}))
+        else:
+            atlases = build_atlases(self.piece_dir, [size])  # Bigger than any standard size
+        for atlas_size, atlas in atlases.items():
+            self.save(atlas_size, atlas)
+        return atlases[size]
+
+    def save(self, size, strip):
+        """Write an atlas strip atomically; a cache directory we cannot write to only costs speed."""
+        path = self.atlas_path(size)
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            temp = f"{path}.{os.getpid()}.tmp"  # Another client may be saving the same strip
+            strip.save(temp, "PNG")
+            os.replace(temp, path)
+        except OSError:
+            pass
+
+    def get(self, symbol, size):
+        """Return the PhotoImage for a piece symbol ('P', 'k', ...) at size x size pixels (Tk thread)."""
+        key = (symbol, size)
+        photo = self.scaled.get(key)
+        if photo is None:
+            photo = ImageTk.PhotoImage(self.preload(size).result()[symbol])
+            self.scaled[key] = photo
+        return photo
+
+
+_shared_sprites = None
+
+def shared_sprites():
+    """The process-wide SpriteCache (created on first use)."""
+    global _shared_sprites
+    if _shared_sprites is None:
+        _shared_sprites = SpriteCache()
+    return _shared_sprites
+
+
+class BoardCanvas:
+    """One board drawn on a single Canvas.
+
+    on_click, if given, is called with the chess square under the pointer.
+    """
+
+    def __init__(self, parent, square_size=50, flipped=False, sprites=None, on_click=None):
+        self.square_size = square_size
+        self.flipped = flipped
+        self.sprites = sprites or shared_sprites()
+        self.on_click = on_click
+        self.canvas = tk.Canvas(parent, width=8 * square_size, height=8 * square_size,
+                                highlightthickness=0, borderwidth=0)
+        self.square_items = {}  # chess square -> rectangle item
+        self.piece_items = {}   # chess square -> image item
+        self.shown = {}         # chess square -> piece symbol currently drawn
+        self.highlighted = None
+        for square in chess.SQUARES:
+            x, y = self.square_origin(square)
+            color = LIGHT_SQUARE if (chess.square_file(square) + chess.square_rank(square)) % 2 else DARK_SQUARE
+            self.square_items[square] = self.canvas.create_rectangle(
+                x, y, x + square_size, y + square_size, fill=color, outline="")
+        if on_click:
+            self.canvas.bind("<Button-1>", self.clicked)
+
+    def grid(self, **kwargs):
+        self.canvas.grid(**kwargs)
+
+    def square_origin(self, square):
+        """Top-left pixel of a square in the current orientation."""
+        file, rank = chess.square_file(square), chess.square_rank(square)
+        if self.flipped:
+            col, row = 7 - file, rank
+        else:
+            col, row = file, 7 - rank
+        return col * self.square_size, row * self.square_size
+
+    def square_at(self, x, y):
+        """Chess square under canvas pixel (x, y), or None outside the board."""
+        col, row = int(x // self.square_size), int(y // self.square_size)
+        if not (0 <= col < 8 and 0 <= row < 8):
+            return None
+        if self.flipped:
+            return chess.square(7 - col, row)
+        return chess.square(col, 7 - row)
+
+    def clicked(self, event):
+        square = self.square_at(event.x, event.y)
+        if square is not None:
+            self.on_click(square)
+
+    def set_position(self, board):
+        """Bring the canvas in line with `board`, touching only squares whose piece changed."""
+        pieces = {square: piece.symbol() for square, piece in board.piece_map().items()}
+        for square in self.shown.keys() | pieces.keys():
+            symbol = pieces.get(square)
+            if self.shown.get(square) == symbol:
+                continue
+            item = self.piece_items.pop(square, None)
+            if symbol is None:
+                self.canvas.delete(item)
+                continue
+            image = self.sprites.get(symbol, self.square_size)
+            if item is None:
+                x, y = self.square_origin(square)
+                item = self.canvas.create_image(x, y, image=image, anchor="nw")
+            else:
+                self.canvas.itemconfigure(item, image=image)
+            self.piece_items[square] = item
+        self.shown = pieces
+
+    def highlight(self, square):
+        """Highlight one square (e.g. the selected piece); None clears it."""
+        if self.highlighted is not None:
+            old = self.highlighted
+            color = LIGHT_SQUARE if (chess.square_file(old) + chess.square_rank(old)) % 2 else DARK_SQUARE
+            self.canvas.itemconfigure(self.square_items[old], fill=color)
+        self.highlighted = square
+        if square is not None:
+            self.canvas.itemconfigure(self.square_items[square], fill=HIGHLIGHT)
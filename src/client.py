@@ -1,88 +1,208 @@
+import asyncio
 import tkinter as tk
 from tkinter import messagebox, simpledialog
 import socket
 import threading
 import chess
 import chess.engine
+import os
 import queue
-from PIL import Image, ImageTk  # Pillow for image resizing
 import time
 
+from analysis import score_to_cp
+from board_canvas import BoardCanvas, shared_sprites
+from protocol import DEFAULT_PORT, FramedSocket, ProtocolError, parse_clock, parse_move
+
+CLOCK_REDRAW_MS = 100  # How often the running clock is redrawn locally
+SQUARE_SIZE = 50  # Pixels per board square
+ENGINE_PATH = os.environ.get("STOCKFISH_PATH", "stockfish")  # Local fallback engine
+RECONNECT_TIMEOUT = 25  # Seconds to keep trying to resume (the server holds the seat for 30)
+
+def format_clock(ms):
+    """Return milliseconds remaining in MM:SS format."""
+    seconds = max(0, ms) // 1000
+    return f"{seconds // 60:02}:{seconds % 60:02}"
+
+class LocalAnalyzer:
+    """Streams evaluations from a local engine without touching the Tk thread.
+
+    The engine runs on its own asyncio loop in a background thread. analyse()
+    only hands the latest position over: if it is the position already being
+    analysed nothing happens, otherwise the stale analysis is stopped and a new
+    infinite one started. Every time the engine reaches a new depth,
+    on_info(ply, centipawns, depth) is called on the background thread.
+    """
+
+    def __init__(self, engine_path, on_info):
+        self.on_info = on_info
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, daemon=True)
+        self.thread.start()
+        self.engine = None
+        self.task = None
+        self.position = None  # FEN of the position being analysed
+        try:
+            asyncio.run_coroutine_threadsafe(self.open(engine_path), self.loop).result(timeout=10)
+        except BaseException:
+            self.loop.call_soon_threadsafe(self.loop.stop)
+            raise
+
+    async def open(self, engine_path):
+        _, self.engine = await chess.engine.popen_uci(engine_path)
+
+    def analyse(self, board):
+        """Switch the analysis to `board` (called from the Tk thread)."""
+        fen = board.fen()
+        if fen == self.position:
+            return  # Unchanged position: keep deepening what is already running
+        self.position = fen
+        self.loop.call_soon_threadsafe(self.restart, board.copy())
+
+    def restart(self, board):
+        if self.task is not None:
+            self.task.cancel()
+        self.task = self.loop.create_task(self.stream(board))
+
+    async def stream(self, board):
+        if board.is_game_over():
+            return
+        deepest = 0
+        try:
+            with await self.engine.analysis(board) as analysis:
+                async for info in analysis:
+                    depth = info.get("depth", 0)
+                    if "score" in info and depth > deepest:
+                        deepest = depth
+                        self.on_info(board.ply(), score_to_cp(info["score"]), depth)
+        except chess.engine.EngineError:
+            pass
+
+    def close(self):
+        async def shutdown():
+            if self.task is not None:
+                self.task.cancel()
+            try:
+                await asyncio.wait_for(self.engine.quit(), 2)
+            except Exception:
+                pass
+        try:
+            asyncio.run_coroutine_threadsafe(shutdown(), self.loop).result(timeout=3)
+        except Exception:
+            pass
+        self.loop.call_soon_threadsafe(self.loop.stop)
+
+
 class ChessGUI:
-    def __init__(self, root, server_ip, username):
+    def __init__(self, root, server_ip, username, room_id="default", port=DEFAULT_PORT):
         self.root = root
         self.username = username
-        self.root.title(f"Multiplayer Chess - {username}")
+        self.room_id = room_id
+        self.root.title(f"Multiplayer Chess - {username} [{room_id}]")
         self.board = chess.Board()
         self.selected_square = None
         self.is_player = None  # True for player, False for spectator
         self.color = None     # 'white' or 'black' for players; spectators have no color
         self.message_queue = queue.Queue()
         self.flip_board = False  # For player's perspective (only if playing)
-        self.piece_images = {}
-        self.blank_image = None
-        self.engine = None    # For evaluation in spectator mode
+        self.local_eval = None  # LocalAnalyzer, only if the server has no engine
         self.col_offset = 0   # 0 for players; 1 for spectators (board shifted right)
+        self.sync_pending = False  # Waiting for a snapshot after a missed move
+        self.clock_ms = {chess.WHITE: 600000, chess.BLACK: 600000}  # Last clock state from the server
+        self.clock_running = None  # Color whose clock is running, or None while stopped
+        self.clock_stamp = time.monotonic()  # When clock_ms was received
+        self.server_address = (server_ip, port)
+        self.session_token = None  # Lets a player resume its seat after a dropped connection
+        self.legal_cache = None  # (from, to) -> legal move for the current position
+        self.legal_hint = None  # (ply, [uci, ...]) from the server's legal: message
+        self.game_over = False
 
-        # Load images (common to all roles)
-        self.load_images()
+        self.running = True
+        self.role_choice = queue.Queue()  # 'p' or 's', handed from the role dialog to the network thread
 
-        # Connect to server
-        self.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        try:
-            self.socket.connect((server_ip, 5555))
-        except Exception as e:
-            messagebox.showerror("Connection Error", f"Could not connect to server: {e}")
-            root.quit()
-            return
+        # Piece sprites load and the connection handshake runs on background
+        # threads while the role dialog is open; the board is built once the
+        # server has seated us.
+        shared_sprites().preload(SQUARE_SIZE)
+        self.status_label = tk.Label(self.root, text=f"Connecting to {server_ip}:{port}...", font=("Helvetica", 14))
+        self.status_label.grid(row=0, column=0, padx=40, pady=40)
 
-        # Protocol: Server asks for name, then for role.
-        prompt = self.socket.recv(1024).decode().strip()  # Expected: "Enter your name:"
-        if prompt != "Enter your name:":
-            messagebox.showerror("Protocol Error", "Did not receive name prompt from server")
-            self.root.quit()
-            return
-        self.socket.send(self.username.encode())
+        # The network thread wakes the Tk loop with a virtual event instead of being polled.
+        self.root.bind("<<NetworkMessage>>", self.check_for_updates)
+        self.network_thread = threading.Thread(target=self.connect_and_listen, daemon=True)
+        self.network_thread.start()
 
-        # Consume the role prompt from the server (to avoid asking twice)
-        role_prompt = self.socket.recv(1024).decode().strip()  # Expected: "Are you a player or spectator? (p/s)"
-        
         # Ask for role via dialog
         role = messagebox.askquestion("Role", "Do you want to be a player? (yes for player, no for spectator)")
-        if role == 'yes':
-            self.socket.send('p'.encode())
-            response = self.socket.recv(1024).decode().strip()
-            if response == "You are white":
-                self.is_player = True
-                self.color = 'white'
-            elif response == "You are black":
-                self.is_player = True
-                self.color = 'black'
-                self.flip_board = True  # Flip board for black's POV
+        self.role_choice.put('p' if role == 'yes' else 's')
+
+    def connect_and_listen(self):
+        """Network thread: connect, answer the server's prompts, then read messages until the game ends."""
+        error = None
+        try:
+            self.socket = FramedSocket(socket.create_connection(self.server_address))
+            # Protocol: Server asks for name, then for the room, then for the role.
+            if self.socket.recv() != "Enter your name:":
+                error = ("Protocol Error", "Did not receive name prompt from server")
             else:
-                messagebox.showinfo("Info", response)
-                self.root.quit()
-                return
+                self.socket.send(self.username)
+                if self.socket.recv() != "Enter room id:":
+                    error = ("Protocol Error", "Did not receive room prompt from server")
+                else:
+                    self.socket.send(self.room_id)
+                    self.socket.recv()  # "Are you a player or spectator? (p/s)"; answered once the dialog closes
+        except (OSError, ProtocolError) as e:
+            error = ("Connection Error", f"Could not connect to server: {e}")
+        role = self.role_choice.get()
+        try:
+            if error is None:
+                self.socket.send(role)
+                response = self.socket.recv()
+                initial_fen = self.socket.recv() if response.startswith("You are ") else None
+        except (OSError, ProtocolError) as e:
+            error = ("Connection Error", f"Lost connection to server: {e}")
+        if error is not None:
+            self.post('error', error)
+            return
+        self.post('joined', (role, response, initial_fen))
+        if initial_fen is None:
+            return
+        # Spectators take evaluations from the server's shared engines; a local
+        # engine is only started if the server replies that it has none.
+        if role == 's':
+            try:
+                self.socket.send("watch_eval")
+            except OSError:
+                pass  # network_loop notices the closed connection
+        self.network_loop()
+
+    def start_game(self, role, response, initial_fen):
+        """Build the board for the seat the server gave us (Tk thread)."""
+        if initial_fen is None:  # Turned away, e.g. "Game is full"
+            messagebox.showinfo("Info", response or "The server closed the connection")
+            self.root.quit()
+            return
+        if role == 'p':
+            self.is_player = True
+            self.color = 'black' if response == "You are black" else 'white'
+            self.flip_board = self.color == 'black'  # Flip board for black's POV
             self.col_offset = 0  # For players, board starts at col 0
         else:
-            self.socket.send('s'.encode())
-            response = self.socket.recv(1024).decode().strip()
-            messagebox.showinfo("Info", response)
             self.is_player = False
             self.col_offset = 1  # Spectators: board shifted right to make room for eval bar
-            try:
-                self.engine = chess.engine.SimpleEngine.popen_uci("C:/Users/thees/Pictures/Eko/Eko/eko/CN package/stockfish/stockfish-windows-x86-64-avx2.exe")
-            except Exception as e:
-                messagebox.showerror("Engine Error", f"Could not start Stockfish engine: {e}")
+        self.status_label.destroy()
 
         # If spectator, create an evaluation canvas on the left side.
         if not self.is_player:
             self.eval_canvas = tk.Canvas(self.root, width=50, height=400, bg="lightgray")
             self.eval_canvas.grid(row=0, column=0, rowspan=8, padx=5, pady=5)
-            self.root.after(1000, self.update_evaluation_bar)
 
         # Create board with grid offset (players: col0, spectators: col1)
-        self.create_board(col_offset=self.col_offset)
+        try:
+            self.create_board(col_offset=self.col_offset)
+        except Exception as e:
+            messagebox.showerror("Image Error", f"Error loading piece images:\n{e}")
+            self.root.quit()
+            return
 
         # Timer label and control buttons below the board.
         timer_col = self.col_offset
@@ -93,61 +213,20 @@ class ChessGUI:
         self.resign_button.grid(row=9, column=timer_col, columnspan=timer_colspan//2, sticky="nsew", padx=5, pady=5)
         self.draw_button = tk.Button(self.root, text="Offer Draw", command=self.offer_draw)
         self.draw_button.grid(row=9, column=timer_col + timer_colspan//2, columnspan=timer_colspan//2, sticky="nsew", padx=5, pady=5)
+        self.root.after(CLOCK_REDRAW_MS, self.tick_clock)
 
-        # Receive initial board state from server.
-        initial_fen = self.socket.recv(1024).decode().strip()
         self.update_board(initial_fen)
-
-        # Start network thread.
-        self.running = True
-        self.network_thread = threading.Thread(target=self.network_loop, daemon=True)
-        self.network_thread.start()
-
-        self.root.after(100, self.check_for_updates)
-
-    def load_images(self):
-        """Load and scale piece images using Pillow."""
-        size = (50, 50)
-        pieces = ['P', 'N', 'B', 'R', 'Q', 'K', 'p', 'n', 'b', 'r', 'q', 'k']
-        base_path = r"C:\Users\thees\Pictures\Eko\Eko\eko\CN package\chesspng"
-        for piece in pieces:
-            prefix = "w" if piece.isupper() else "b"
-            file_path = f"{base_path}\\{prefix}{piece.upper()}.png"
-            try:
-                img = Image.open(file_path)
-                img = img.resize(size, Image.LANCZOS)
-                self.piece_images[piece] = ImageTk.PhotoImage(img)
-            except Exception as e:
-                messagebox.showerror("Image Error", f"Error loading {file_path}:\n{e}")
-                self.root.quit()
-        self.blank_image = tk.PhotoImage(width=size[0], height=size[1])
-
-    def get_square(self, grid_row, grid_col):
-        """
-        Map grid coordinates (row, col) to a chess square index.
-        For players: white's view (row0=rank8) or black's view (if flip_board is True).
-        Spectators always see white's orientation.
-        """
-        if self.is_player:
-            if not self.flip_board:
-                return chess.square(grid_col, 7 - grid_row)
-            else:
-                return chess.square(7 - grid_col, grid_row)
-        else:
-            return chess.square(grid_col, 7 - grid_row)
+        if not self.is_player:
+            messagebox.showinfo("Info", response)
 
     def create_board(self, col_offset=0):
-        """Create an 8x8 grid of buttons. col_offset shifts board to the right if needed."""
-        self.buttons = [[None for _ in range(8)] for _ in range(8)]
-        colors = ['white', 'gray']
-        for row in range(8):
-            for col in range(8):
-                color = colors[(row + col) % 2]
-                button = tk.Button(self.root, bg=color, relief="ridge", borderwidth=1,
-                                   command=lambda r=row, c=col: self.square_clicked(self.get_square(r, c)))
-                button.grid(row=row, column=col + col_offset)
-                self.buttons[row][col] = button
-        self.update_board(self.board.fen())
+        """Create the board canvas. col_offset shifts it to the right if needed."""
+        # Spectators always see white's orientation; black players see their own side at the bottom.
+        self.board_view = BoardCanvas(self.root, square_size=SQUARE_SIZE,
+                                      flipped=self.is_player and self.flip_board,
+                                      on_click=self.square_clicked)
+        self.board_view.grid(row=0, column=col_offset, rowspan=8, columnspan=8)
+        self.refresh_board()
 
     def square_clicked(self, square):
         """Handle a click on a square; send move if legal (players only)."""
@@ -158,31 +237,98 @@ class ChessGUI:
             piece = self.board.piece_at(square)
             if piece and piece.color == (self.color == 'white'):
                 self.selected_square = square
+                self.board_view.highlight(square)
         else:
-            move = chess.Move(self.selected_square, square)
-            if move in self.board.legal_moves:
+            move = self.legal_targets().get((self.selected_square, square))
+            if move is not None:
                 try:
-                    self.socket.send(move.uci().encode())
+                    self.socket.send(move.uci())
                 except Exception as e:
                     messagebox.showerror("Error", f"Failed to send move: {e}")
             self.selected_square = None
+            self.board_view.highlight(None)
+
+    def legal_targets(self):
+        """(from, to) -> legal move for the current position, built once per position.
+
+        Uses the server's legal-move hint when it sent one for this ply. Pawns
+        reaching the last rank promote to a queen.
+        """
+        if self.legal_cache is None:
+            if self.legal_hint is not None and self.legal_hint[0] == self.board.ply():
+                moves = [chess.Move.from_uci(uci) for uci in self.legal_hint[1]]
+            else:
+                moves = self.board.legal_moves
+            targets = {}
+            for move in moves:
+                key = (move.from_square, move.to_square)
+                if key not in targets or move.promotion == chess.QUEEN:
+                    targets[key] = move
+            self.legal_cache = targets
+        return self.legal_cache
 
     def update_board(self, fen):
-        """Update board state and refresh button images."""
+        """Replace the board with a full snapshot (FEN) and refresh it."""
         self.board.set_fen(fen)
-        for row in range(8):
-            for col in range(8):
-                square = self.get_square(row, col)
-                piece = self.board.piece_at(square)
-                image = self.piece_images.get(piece.symbol(), self.blank_image) if piece else self.blank_image
-                self.buttons[row][col].config(image=image, text="")
-                self.buttons[row][col].image = image
+        self.sync_pending = False
+        self.refresh_board()
+
+    def apply_move(self, message):
+        """Apply a 'move:<ply>:<uci>:<white_ms>,<black_ms>' delta from the server."""
+        try:
+            ply, uci, clocks = parse_move(message)
+            move = chess.Move.from_uci(uci)
+        except ValueError:
+            return
+        if ply <= self.board.ply():
+            return  # Already applied (e.g. covered by a newer snapshot)
+        if ply != self.board.ply() + 1:
+            # Missed a move: ask the server for a fresh snapshot (once).
+            if not self.sync_pending:
+                self.sync_pending = True
+                try:
+                    self.socket.send("sync")
+                except Exception:
+                    pass
+            return
+        self.board.push(move)
+        self.refresh_board()
+        # After a move the clock of the new side to move runs (unless the game is paused).
+        self.set_clock(clocks, self.board.turn if self.clock_running is not None else None)
+
+    def set_clock(self, clocks, running):
+        """Store the server's clock state ((white_ms, black_ms)) and which color is running."""
+        self.clock_ms = {chess.WHITE: clocks[0], chess.BLACK: clocks[1]}
+        self.clock_running = running
+        self.clock_stamp = time.monotonic()
+        self.update_clock_label()
+
+    def update_clock_label(self):
+        """Show both clocks, counting down the running side locally between server updates."""
+        shown = dict(self.clock_ms)
+        if self.clock_running is not None:
+            elapsed_ms = int((time.monotonic() - self.clock_stamp) * 1000)
+            shown[self.clock_running] -= elapsed_ms
+        self.timer_label.config(text=f"White: {format_clock(shown[chess.WHITE])}   Black: {format_clock(shown[chess.BLACK])}")
+
+    def tick_clock(self):
+        """Redraw the interpolated clock a few times a second while it runs."""
+        if self.clock_running is not None:
+            self.update_clock_label()
+        self.root.after(CLOCK_REDRAW_MS, self.tick_clock)
+
+    def refresh_board(self):
+        """Redraw the squares whose piece changed since the last refresh."""
+        self.board_view.set_position(self.board)
+        self.legal_cache = None
+        if self.local_eval:
+            self.local_eval.analyse(self.board)
 
     def resign(self):
         """Send resign command to the server."""
         if self.is_player:
             try:
-                self.socket.send("resign".encode())
+                self.socket.send("resign")
             except Exception as e:
                 messagebox.showerror("Error", f"Failed to send resign: {e}")
 
@@ -190,84 +336,173 @@ class ChessGUI:
         """Send draw offer to the server."""
         if self.is_player:
             try:
-                self.socket.send("offer_draw".encode())
+                self.socket.send("offer_draw")
             except Exception as e:
                 messagebox.showerror("Error", f"Failed to send draw offer: {e}")
 
-    def update_evaluation_bar(self):
-        """For spectators: use Stockfish to evaluate the board and update the evaluation bar."""
-        if not self.is_player and self.engine:
+    def start_local_engine(self):
+        """Fallback when the server has no analysis engine: run Stockfish locally in the background."""
+        try:
+            self.local_eval = LocalAnalyzer(ENGINE_PATH, self.on_local_eval)
+        except Exception as e:
+            self.local_eval = None
+            messagebox.showerror("Engine Error", f"Could not start Stockfish engine: {e}")
+            return
+        self.local_eval.analyse(self.board)
+
+    def on_local_eval(self, ply, score, depth):
+        """Called on the analysis thread for every deeper result."""
+        self.post('local_eval', (ply, score, depth))
+
+    def show_server_eval(self, message):
+        """Draw an 'eval:<ply>:<centipawns>:<depth>' message if it is for the current position."""
+        try:
+            _, ply, score, depth = message.split(":")
+            ply, score, depth = int(ply), int(score), int(depth)
+        except ValueError:
+            return
+        if ply == self.board.ply():
+            self.draw_evaluation(score, depth)
+
+    def draw_evaluation(self, score, depth=None):
+        """Fill the evaluation bar: green for White's advantage, red for Black's."""
+        max_val = 500
+        height = int(self.eval_canvas['height'])
+        center = height // 2
+        self.eval_canvas.delete("all")
+        self.eval_canvas.create_rectangle(0, 0, 50, height, fill="lightgray", outline="")
+        if score > max_val:
+            score = max_val
+        if score < -max_val:
+            score = -max_val
+        if score >= 0:
+            fill_height = int((score / max_val) * (height / 2))
+            self.eval_canvas.create_rectangle(0, center - fill_height, 50, center, fill="green", outline="")
+        else:
+            fill_height = int((abs(score) / max_val) * (height / 2))
+            self.eval_canvas.create_rectangle(0, center, 50, center + fill_height, fill="red", outline="")
+        eval_text = f"{score/100:.2f}"
+        self.eval_canvas.create_text(25, center, text=eval_text, fill="black", font=("Helvetica", 12))
+        if depth is not None:
+            self.eval_canvas.create_text(25, height - 10, text=f"d{depth}", fill="black", font=("Helvetica", 9))
+
+    def post(self, msg_type, message):
+        """Hand a message to the Tk thread and wake it up (called from the network thread)."""
+        self.message_queue.put((msg_type, message))
+        try:
+            self.root.event_generate("<<NetworkMessage>>", when="tail")
+        except (tk.TclError, RuntimeError):
+            pass  # Window already closed
+
+    def reconnect(self):
+        """Resume our seat on a new connection after the old one dropped (network thread).
+
+        The server replays the moves we missed since our last applied ply, or
+        sends a snapshot if we are too far behind. Returns True on success.
+        """
+        deadline = time.monotonic() + RECONNECT_TIMEOUT
+        delay = 0.5
+        while self.running and time.monotonic() < deadline:
             try:
-                info = self.engine.analyse(self.board, chess.engine.Limit(time=0.1))
-                score_obj = info["score"].white()
-                if score_obj.is_mate():
-                    score = 10000 if score_obj.mate() > 0 else -10000
-                else:
-                    score = score_obj.score()
-            except Exception:
-                score = 0
-            max_val = 500
-            height = int(self.eval_canvas['height'])
-            center = height // 2
-            self.eval_canvas.delete("all")
-            self.eval_canvas.create_rectangle(0, 0, 50, height, fill="lightgray", outline="")
-            if score > max_val:
-                score = max_val
-            if score < -max_val:
-                score = -max_val
-            if score >= 0:
-                fill_height = int((score / max_val) * (height / 2))
-                self.eval_canvas.create_rectangle(0, center - fill_height, 50, center, fill="green", outline="")
-            else:
-                fill_height = int((abs(score) / max_val) * (height / 2))
-                self.eval_canvas.create_rectangle(0, center, 50, center + fill_height, fill="red", outline="")
-            eval_text = f"{score/100:.2f}"
-            self.eval_canvas.create_text(25, center, text=eval_text, fill="black", font=("Helvetica", 12))
-        self.root.after(1000, self.update_evaluation_bar)
+                conn = FramedSocket(socket.create_connection(self.server_address, timeout=5))
+                conn.recv()  # "Enter your name:"
+                conn.send(f"resume:{self.session_token}:{self.board.ply()}")
+                if conn.recv() != f"Resumed {self.color}":
+                    conn.close()
+                    return False
+                conn.sock.settimeout(None)
+            except (OSError, ProtocolError):
+                time.sleep(delay)
+                delay = min(delay * 2, 4)
+                continue
+            old, self.socket = self.socket, conn
+            try:
+                old.close()
+            except OSError:
+                pass
+            return True
+        return False
+
+    def connection_lost(self):
+        """Try to resume a game in progress; returns True if the network loop can carry on."""
+        if self.is_player and self.session_token and self.running and not self.game_over:
+            if self.reconnect():
+                return True
+        self.post('msg', "Connection lost")
+        return False
 
     def network_loop(self):
         while self.running:
             try:
-                message = self.socket.recv(1024).decode().strip()
-                if not message:
-                    self.message_queue.put(('msg', "Connection lost"))
-                    break
-                if message.startswith("timer:"):
-                    self.message_queue.put(('timer', message))
-                elif message == "draw_offer":
-                    self.message_queue.put(('draw_offer', message))
-                elif message.startswith("Game over:"):
-                    self.message_queue.put(('gameover', message))
-                elif ' ' in message and '/' in message:  # Rough FEN check
-                    self.message_queue.put(('fen', message))
-                else:
-                    self.message_queue.put(('msg', message))
+                message = self.socket.recv()
             except Exception:
-                self.message_queue.put(('msg', "Connection lost"))
+                message = ""
+            if not message:
+                if self.connection_lost():
+                    continue
                 break
+            if message.startswith("session:"):
+                self.session_token = message.split(":", 1)[1]
+            elif message.startswith("move:"):
+                self.post('move', message)
+            elif message.startswith("clock:"):
+                self.post('clock', message)
+            elif message.startswith("eval:"):
+                self.post('eval', message)
+            elif message.startswith("legal:"):
+                self.post('legal', message)
+            elif message == "draw_offer":
+                self.post('draw_offer', message)
+            elif message.startswith("Game over:"):
+                self.game_over = True
+                self.post('gameover', message)
+                break  # The server closes the room after announcing the result
+            elif ' ' in message and '/' in message:  # Rough FEN check
+                self.post('fen', message)
+            else:
+                self.post('msg', message)
 
-    def check_for_updates(self):
+    def check_for_updates(self, event=None):
+        """Handle everything the network thread has queued."""
         while not self.message_queue.empty():
             msg_type, message = self.message_queue.get()
-            if msg_type == 'fen':
+            if msg_type == 'joined':
+                self.start_game(*message)
+            elif msg_type == 'error':
+                messagebox.showerror(*message)
+                self.root.quit()
+            elif msg_type == 'move':
+                self.apply_move(message)
+            elif msg_type == 'fen':
                 self.update_board(message)
-            elif msg_type == 'timer':
+            elif msg_type == 'clock':
                 try:
-                    _, times = message.split(":", 1)
-                    white_time, black_time = times.split(",")
-                    self.timer_label.config(text=f"White: {white_time}   Black: {black_time}")
-                except Exception:
-                    pass
+                    clocks, running = parse_clock(message)
+                except ValueError:
+                    continue
+                self.set_clock(clocks, {'white': chess.WHITE, 'black': chess.BLACK}.get(running))
+            elif msg_type == 'eval':
+                if message == "eval:off":
+                    self.start_local_engine()
+                else:
+                    self.show_server_eval(message)
+            elif msg_type == 'legal':
+                _, ply, moves = message.split(":", 2)
+                self.legal_hint = (int(ply), moves.split())
+            elif msg_type == 'local_eval':
+                ply, score, depth = message
+                if ply == self.board.ply():
+                    self.draw_evaluation(score, depth)
             elif msg_type == 'draw_offer':
                 answer = messagebox.askyesno("Draw Offer", "Your opponent offers a draw. Accept?")
                 if answer:
                     try:
-                        self.socket.send("accept_draw".encode())
+                        self.socket.send("accept_draw")
                     except Exception as e:
                         messagebox.showerror("Error", f"Failed to send accept draw: {e}")
                 else:
                     try:
-                        self.socket.send("decline_draw".encode())
+                        self.socket.send("decline_draw")
                     except Exception as e:
                         messagebox.showerror("Error", f"Failed to send decline draw: {e}")
             elif msg_type == 'gameover':
@@ -276,7 +511,6 @@ class ChessGUI:
                 self.root.after(5000, self.on_closing)
             elif msg_type == 'msg':
                 messagebox.showinfo("Message", message)
-        self.root.after(100, self.check_for_updates)
 
     def on_closing(self):
         self.running = False
@@ -284,8 +518,8 @@ class ChessGUI:
             self.socket.close()
         except Exception:
             pass
-        if self.engine:
-            self.engine.quit()
+        if self.local_eval:
+            self.local_eval.close()
         self.root.destroy()
 
 if __name__ == "__main__":
@@ -296,12 +530,14 @@ if __name__ == "__main__":
         messagebox.showerror("Error", "Username is required")
         root.quit()
     else:
-        server_ip = simpledialog.askstring("Server IP", "Enter server IP:")
+        server_ip = simpledialog.askstring("Server IP", "Enter server IP (host or host:port):")
         if not server_ip:
             messagebox.showerror("Error", "Server IP is required")
             root.quit()
         else:
+            room_id = simpledialog.askstring("Room", "Enter room id:", initialvalue="default") or "default"
+            host, _, port = server_ip.partition(":")
             root.deiconify()
-            gui = ChessGUI(root, server_ip, username)
+            gui = ChessGUI(root, host, username, room_id, int(port) if port.isdigit() else DEFAULT_PORT)
             root.protocol("WM_DELETE_WINDOW", gui.on_closing)
             root.mainloop()
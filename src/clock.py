@@ -0,0 +1,122 @@
+"""Chess clocks driven by monotonic deadlines.
+
+A GameClock never ticks on its own. It stores how much time each side had
+left when its turn started and the monotonic instant that turn started, so the
+remaining time and the moment the side to move flags can be computed at any
+point. The server arms one event-loop timer per game at that deadline instead
+of polling every game once a second.
+"""
+import re
+import time
+
+import chess
+
+_TIME_CONTROL_RE = re.compile(r"^(\d+(?:\.\d+)?)(?:\+(\d+(?:\.\d+)?))?(?:d(\d+(?:\.\d+)?))?$")
+
+
+class TimeControl:
+    """Base time per side plus an optional Fischer increment and/or simple delay (all in seconds)."""
+
+    def __init__(self, base, increment=0, delay=0):
+        self.base = base
+        self.increment = increment
+        self.delay = delay
+
+    @classmethod
+    def parse(cls, text):
+        """Parse '600', '300+2' (increment), '180d3' (delay) or '300+2d1'."""
+        match = _TIME_CONTROL_RE.match(text.strip())
+        if not match:
+            raise ValueError(f"invalid time control {text!r} (expected e.g. 600, 300+2 or 180d3)")
+        base, increment, delay = (float(g) if g else 0 for g in match.groups())
+        if base <= 0:
+            raise ValueError("base time must be positive")
+        return cls(base, increment, delay)
+
+    def __str__(self):
+        text = f"{self.base:g}"
+        if self.increment:
+            text += f"+{self.increment:g}"
+        if self.delay:
+            text += f"d{self.delay:g}"
+        return text
+
+    def __eq__(self, other):
+        return isinstance(other, TimeControl) and \
+            (self.base, self.increment, self.delay) == (other.base, other.increment, other.delay)
+
+    def __hash__(self):
+        return hash((self.base, self.increment, self.delay))
+
+
+class GameClock:
+    """Two-sided chess clock. Times are in seconds, instants come from time.monotonic()."""
+
+    def __init__(self, time_control):
+        self.time_control = time_control
+        self.remaining = {chess.WHITE: time_control.base, chess.BLACK: time_control.base}
+        self.turn = chess.WHITE
+        self.turn_started = None  # Monotonic time the running side started thinking; None while stopped
+
+    @property
+    def running(self):
+        return self.turn_started is not None
+
+    def start(self, turn, now=None):
+        """Start (or resume) the clock of the side to move."""
+        self.turn = turn
+        self.turn_started = time.monotonic() if now is None else now
+
+    def stop(self, now=None):
+        """Stop the clock, charging the running side for the time used so far."""
+        if self.running:
+            now = time.monotonic() if now is None else now
+            self.remaining[self.turn] = self.time_left(self.turn, now)
+            self.turn_started = None
+
+    def time_left(self, color, now=None):
+        """Seconds `color` has left at `now` (never negative)."""
+        if not self.running or color != self.turn:
+            return self.remaining[color]
+        now = time.monotonic() if now is None else now
+        used = max(0.0, now - self.turn_started - self.time_control.delay)
+        return max(0.0, self.remaining[color] - used)
+
+    def deadline(self):
+        """Monotonic instant the side to move runs out of time, or None while stopped."""
+        if not self.running:
+            return None
+        return self.turn_started + self.time_control.delay + self.remaining[self.turn]
+
+    def press(self, now=None):
+        """The side to move has moved: charge its time, add the increment and switch sides.
+
+        Returns False, leaving the clock stopped, if that side had already run out of time.
+        """
+        now = time.monotonic() if now is None else now
+        left = self.time_left(self.turn, now)
+        if self.running and left <= 0:
+            self.remaining[self.turn] = 0.0
+            self.turn_started = None
+            return False
+        self.remaining[self.turn] = left + self.time_control.increment
+        self.turn = not self.turn
+        if self.running:
+            self.turn_started = now
+        return True
+
+    def set_state(self, clocks, turn, running, now=None):
+        """Take over a clock reported elsewhere: (white_ms, black_ms), the side to move, and
+        whether its clock is running (counted from `now`)."""
+        self.remaining = {chess.WHITE: clocks[0] / 1000, chess.BLACK: clocks[1] / 1000}
+        self.turn = turn
+        self.turn_started = (time.monotonic() if now is None else now) if running else None
+
+    def milliseconds(self, now=None):
+        """Both remaining times in whole milliseconds, as (white, black)."""
+        now = time.monotonic() if now is None else now
+        return int(self.time_left(chess.WHITE, now) * 1000), int(self.time_left(chess.BLACK, now) * 1000)
+
+    def state(self, now=None):
+        """Compact clock state: both remaining times in whole milliseconds, as 'white,black'."""
+        return "%d,%d" % self.milliseconds(now)
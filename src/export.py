@@ -0,0 +1,104 @@
+"""PGN export of finished games.
+
+A server started with --pgn FILE appends every game that ends with a result
+to FILE as PGN, so finished games outlive the in-memory archive and the
+journal (whose snapshots only keep games in progress). end_game() only queues
+the packed ArchivedGame; a background task turns the queued games into PGN
+text and appends them every EXPORT_INTERVAL seconds on an executor thread, so
+the SAN generation and the disk write stay off the event loop.
+
+The file can be fed straight to annotate.py.
+"""
+import asyncio
+import time
+
+import chess.pgn
+
+EXPORT_INTERVAL = 1.0  # seconds between appends
+
+
+def pgn_result(result):
+    """The PGN result token for a server result text such as 'White wins by timeout'."""
+    if result.startswith("White wins"):
+        return "1-0"
+    if result.startswith("Black wins"):
+        return "0-1"
+    if result.startswith("Draw"):
+        return "1/2-1/2"
+    return "*"
+
+def termination(result):
+    """The PGN Termination tag for a server result text."""
+    if result.endswith("by timeout"):
+        return "time forfeit"
+    if result.endswith("by abandonment"):
+        return "abandoned"
+    return "normal"
+
+def game_pgn(game):
+    """PGN text for an ArchivedGame."""
+    pgn = chess.pgn.Game.from_board(game.board())
+    pgn.headers["Event"] = "Casual game"
+    pgn.headers["Site"] = game.room_id
+    pgn.headers["Date"] = time.strftime("%Y.%m.%d", time.gmtime(game.ended))
+    pgn.headers["Round"] = "-"
+    pgn.headers["White"] = game.white or "?"
+    pgn.headers["Black"] = game.black or "?"
+    pgn.headers["Result"] = pgn_result(game.result)
+    pgn.headers["TimeControl"] = game.time_control
+    pgn.headers["Termination"] = termination(game.result)
+    pgn.comment = game.result
+    return str(pgn) + "\n\n"
+
+
+class PgnExport:
+    """Appends finished games to a PGN file in the background."""
+
+    def __init__(self, path, interval=EXPORT_INTERVAL):
+        self.path = path
+        self.interval = interval
+        self.pending = []  # ArchivedGames not yet written
+        self.file = None
+        self.flusher = None
+        self.wakeup = None
+        self.closing = False
+        self.exported = 0
+
+    async def open(self):
+        self.file = open(self.path, "a", encoding="utf-8")
+        self.wakeup = asyncio.Event()
+        self.flusher = asyncio.get_running_loop().create_task(self.run())
+
+    def add(self, game):
+        self.pending.append(game)
+
+    async def run(self):
+        while not self.closing:
+            try:
+                await asyncio.wait_for(self.wakeup.wait(), self.interval)
+            except asyncio.TimeoutError:
+                pass
+            await self.flush()
+
+    async def flush(self):
+        if not self.pending:
+            return
+        games = self.pending
+        self.pending = []
+        await asyncio.get_running_loop().run_in_executor(None, self.write, games)
+        self.exported += len(games)
+
+    def write(self, games):
+        self.file.write("".join(game_pgn(game) for game in games))
+        self.file.flush()
+
+    async def close(self):
+        """Write whatever is queued and close the file."""
+        self.closing = True
+        if self.flusher is not None:
+            self.wakeup.set()
+            await self.flusher
+        await self.flush()
+        if self.file is not None:
+            self.file.close()
+            self.file = None
@@ -0,0 +1,107 @@
+"""Headless scripted client: the text protocol over asyncio streams, no display.
+
+Used by the benchmarks and the load driver, and usable for bots:
+
+    client = await connect("127.0.0.1", 5555, "bot", "room1", "p")
+    client.send("e2e4")
+    await client.wait_for("move:1:")
+
+A HeadlessClient follows the game as messages pass through it: the board
+(from the FEN snapshot and move deltas), the clocks, its session token and
+the result.
+"""
+import asyncio
+import collections
+
+import chess
+
+import protocol
+
+
+class HeadlessClient:
+    """One framed connection to the server plus the game state seen on it."""
+
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+        self.decoder = protocol.FrameDecoder()
+        self.incoming = collections.deque()
+        self.board = chess.Board()
+        self.color = None  # 'white' or 'black' once seated as a player
+        self.room_id = None  # Only known for matchmaking ('Matched in room ...')
+        self.token = None  # Session token for resuming
+        self.clocks = None  # (white_ms, black_ms) from the last move: or clock: message
+        self.result = None  # Text after 'Game over:' once the game has ended
+
+    async def recv(self):
+        """Next message; raises ConnectionError once the server has closed the connection."""
+        while not self.incoming:
+            data = await self.reader.read(65536)
+            if not data:
+                raise ConnectionError("server closed the connection")
+            self.incoming.extend(self.decoder.feed(data))
+        message = self.incoming.popleft()
+        self.observe(message)
+        return message
+
+    def observe(self, message):
+        """Update the tracked game state from one server message."""
+        if message.startswith("move:"):
+            ply, uci, clocks = protocol.parse_move(message)
+            if ply == self.board.ply() + 1:
+                self.board.push_uci(uci)
+            self.clocks = clocks
+        elif message.startswith("clock:"):
+            self.clocks = protocol.parse_clock(message)[0]
+        elif message.startswith("session:"):
+            self.token = message.split(":", 1)[1]
+        elif message.startswith("Game over:"):
+            self.result = message.split(":", 1)[1].strip()
+        elif message.startswith("You are "):
+            color = message[len("You are "):]
+            self.color = color if color in ('white', 'black') else None
+        elif message.startswith("Matched in room "):
+            self.room_id = message[len("Matched in room "):]
+        elif message.count('/') == 7:  # FEN snapshot
+            self.board.set_fen(message)
+
+    def send(self, message):
+        self.writer.write(protocol.encode(message))
+
+    async def wait_for(self, prefix):
+        """Read until a message starting with `prefix` arrives and return it."""
+        while True:
+            message = await self.recv()
+            if message.startswith(prefix):
+                return message
+
+    def close(self):
+        self.writer.close()
+
+
+async def connect(host, port, name, room_id, role):
+    """Connect and run the name/room/role handshake.
+
+    role is 'p', 's' or a matchmaking seek ('m:<rating>[:<time control>]').
+    Returns once the initial position has arrived; raises ConnectionError if
+    the server turns the client away (e.g. 'Game is full').
+    """
+    reader, writer = await asyncio.open_connection(host, port)
+    client = HeadlessClient(reader, writer)
+    try:
+        for answer in (name, room_id, role):
+            await client.recv()  # prompt
+            client.send(answer)
+        reply = await client.recv()
+        if reply == "Waiting for an opponent":
+            await client.wait_for("Matched in room ")
+            reply = await client.recv()
+        elif reply.startswith("Matched in room "):  # Paired on arrival, without waiting
+            reply = await client.recv()
+        if not reply.startswith("You are "):
+            raise ConnectionError(reply)
+        await client.recv()  # initial FEN
+    except BaseException:
+        client.close()
+        raise
+    return client
@@ -0,0 +1,317 @@
+"""Append-only game journal with group commit, snapshots and crash recovery.
+
+Every accepted move, clock change and game result is appended to the current
+journal segment as a small binary record:
+
+    <u16 payload length><u32 crc32 of payload><payload>
+
+where the payload starts with a record type byte. Games are referred to by a
+journal game number assigned when their first move is recorded, so a move
+record is 15 payload bytes. Appends only fill an in-memory buffer; a
+background task writes and fsyncs the buffer every COMMIT_INTERVAL seconds
+(group commit), so one fsync covers every move made in every room during that
+interval.
+
+Every SNAPSHOT_INTERVAL seconds the journal rotates to a new segment and
+writes a snapshot of all games still in progress (in the same record format),
+then deletes the segments and snapshots the new one supersedes. Recovery
+replays the newest complete snapshot and the segments after it, so replay
+time is bounded by the snapshot interval instead of the server's lifetime.
+A torn record at the end of a segment (crash mid-write) is ignored.
+"""
+import asyncio
+import os
+import re
+import struct
+import time
+import zlib
+
+import chess
+
+COMMIT_INTERVAL = 0.005  # seconds between group commits
+SNAPSHOT_INTERVAL = 60.0  # seconds between snapshots
+
+START, MOVE, CLOCK, END, MOVES = range(1, 6)
+
+_HEADER = struct.Struct("<HI")          # payload length, crc32
+_MOVE = struct.Struct("<BIHII")         # type, game, move, white_ms, black_ms
+_CLOCK = struct.Struct("<BIII")         # type, game, white_ms, black_ms
+_GAME = struct.Struct("<BI")            # type, game (followed by text or move array)
+_SEGMENT_RE = re.compile(r"^journal-(\d{8})\.log$")
+_SNAPSHOT_RE = re.compile(r"^snapshot-(\d{8})\.bin$")
+
+
+def encode_move(move):
+    """Pack a move into 16 bits: from (6) | to (6) << 6 | promotion piece type (3) << 12."""
+    return move.from_square | (move.to_square << 6) | ((move.promotion or 0) << 12)
+
+def decode_move(code):
+    return chess.Move(code & 0x3f, (code >> 6) & 0x3f, (code >> 12) or None)
+
+
+class JournaledGame:
+    """Everything the journal knows about one game."""
+
+    __slots__ = ("game_no", "room_id", "time_control", "moves", "clocks", "result")
+
+    def __init__(self, game_no, room_id, time_control, moves=None, clocks=None, result=None):
+        self.game_no = game_no
+        self.room_id = room_id
+        self.time_control = time_control  # TimeControl string, e.g. '600' or '180+2'
+        self.moves = moves if moves is not None else []  # 16-bit encoded moves
+        self.clocks = clocks  # (white_ms, black_ms) after the last move or clock record
+        self.result = result  # None while in progress
+
+    def board(self):
+        """Replay the moves onto a fresh board."""
+        board = chess.Board()
+        for code in self.moves:
+            board.push(decode_move(code))
+        return board
+
+
+def _record(payload):
+    return _HEADER.pack(len(payload), zlib.crc32(payload)) + payload
+
+def start_record(game_no, room_id, time_control):
+    return _record(_GAME.pack(START, game_no) + f"{room_id}\0{time_control}".encode())
+
+def move_record(game_no, code, clocks):
+    return _record(_MOVE.pack(MOVE, game_no, code, clocks[0], clocks[1]))
+
+def clock_record(game_no, clocks):
+    return _record(_CLOCK.pack(CLOCK, game_no, clocks[0], clocks[1]))
+
+def end_record(game_no, result):
+    return _record(_GAME.pack(END, game_no) + result.encode())
+
+def moves_record(game_no, codes):
+    return _record(_GAME.pack(MOVES, game_no) + struct.pack(f"<{len(codes)}H", *codes))
+
+def snapshot_records(game):
+    """The records that recreate one in-progress game."""
+    data = start_record(game.game_no, game.room_id, game.time_control)
+    if game.moves:
+        data += moves_record(game.game_no, game.moves)
+    if game.clocks is not None:
+        data += clock_record(game.game_no, game.clocks)
+    return data
+
+
+def replay(data, games):
+    """Apply the records in `data` to `games` (game number -> JournaledGame).
+
+    Returns the number of bytes consumed; a shorter count than len(data) means
+    the rest is a torn or corrupt tail.
+    """
+    view = memoryview(data)
+    offset = 0
+    end = len(data)
+    while offset + _HEADER.size <= end:
+        length, crc = _HEADER.unpack_from(view, offset)
+        start = offset + _HEADER.size
+        payload = view[start:start + length]
+        if len(payload) < length or zlib.crc32(payload) != crc:
+            break
+        kind = payload[0]
+        if kind == MOVE:
+            _, game_no, code, white_ms, black_ms = _MOVE.unpack_from(payload)
+            game = games.get(game_no)
+            if game is not None:
+                game.moves.append(code)
+                game.clocks = (white_ms, black_ms)
+        elif kind == CLOCK:
+            _, game_no, white_ms, black_ms = _CLOCK.unpack_from(payload)
+            game = games.get(game_no)
+            if game is not None:
+                game.clocks = (white_ms, black_ms)
+        elif kind == START:
+            _, game_no = _GAME.unpack_from(payload)
+            room_id, time_control = bytes(payload[_GAME.size:]).decode().split("\0", 1)
+            games[game_no] = JournaledGame(game_no, room_id, time_control)
+        elif kind == END:
+            _, game_no = _GAME.unpack_from(payload)
+            game = games.get(game_no)
+            if game is not None:
+                game.result = bytes(payload[_GAME.size:]).decode()
+        elif kind == MOVES:
+            _, game_no = _GAME.unpack_from(payload)
+            game = games.get(game_no)
+            if game is not None:
+                count = (length - _GAME.size) // 2
+                game.moves.extend(struct.unpack_from(f"<{count}H", payload, _GAME.size))
+        offset = start + length
+    return offset
+
+
+class Journal:
+    """Journal directory: numbered segments plus the snapshot that starts each one."""
+
+    def __init__(self, directory, commit_interval=COMMIT_INTERVAL, snapshot_interval=SNAPSHOT_INTERVAL):
+        self.directory = directory
+        self.commit_interval = commit_interval
+        self.snapshot_interval = snapshot_interval
+        self.buffer = bytearray()
+        self.segment = None  # Open file of the current segment
+        self.sequence = 0
+        self.next_game_no = 1
+        self.snapshot_source = None
+        self.flusher = None
+        self.wakeup = None
+        self.closing = False
+        self.stats = {'records': 0, 'commits': 0, 'bytes': 0, 'snapshots': 0}
+        os.makedirs(directory, exist_ok=True)
+
+    def path(self, kind, sequence):
+        name = f"journal-{sequence:08d}.log" if kind == "segment" else f"snapshot-{sequence:08d}.bin"
+        return os.path.join(self.directory, name)
+
+    def listing(self):
+        """Sequence numbers of the segments and snapshots on disk."""
+        segments, snapshots = [], []
+        for name in os.listdir(self.directory):
+            match = _SEGMENT_RE.match(name)
+            if match:
+                segments.append(int(match.group(1)))
+            match = _SNAPSHOT_RE.match(name)
+            if match:
+                snapshots.append(int(match.group(1)))
+        return sorted(segments), sorted(snapshots)
+
+    def recover(self):
+        """Rebuild every journaled game from the newest snapshot and the segments after it.
+
+        Returns game number -> JournaledGame, finished games included. Must be
+        called before open().
+        """
+        segments, snapshots = self.listing()
+        games = {}
+        base = 0
+        if snapshots:
+            base = snapshots[-1]
+            with open(self.path("snapshot", base), "rb") as f:
+                replay(f.read(), games)
+        for sequence in segments:
+            if sequence < base:
+                continue
+            path = self.path("segment", sequence)
+            with open(path, "rb") as f:
+                data = f.read()
+            used = replay(data, games)
+            if used < len(data):
+                print(f"Journal: ignoring {len(data) - used} torn bytes at the end of {path}")
+        if games:
+            self.next_game_no = max(games) + 1
+        self.sequence = max(segments + snapshots, default=0)
+        return games
+
+    async def open(self, snapshot_source):
+        """Start a fresh segment and the background commit task.
+
+        snapshot_source() must return a JournaledGame for every game in progress.
+        """
+        self.snapshot_source = snapshot_source
+        self.wakeup = asyncio.Event()
+        # Everything recovered goes into a snapshot right away, so old segments can go.
+        await self.snapshot()
+        self.flusher = asyncio.get_running_loop().create_task(self.run())
+
+    def append(self, data):
+        self.buffer += data
+        self.stats['records'] += 1
+
+    def start_game(self, room_id, time_control):
+        """Assign a journal game number and record the game's start."""
+        game_no = self.next_game_no
+        self.next_game_no += 1
+        self.append(start_record(game_no, room_id, time_control))
+        return game_no
+
+    def record_move(self, game_no, move, clocks):
+        self.append(move_record(game_no, encode_move(move), clocks))
+
+    def record_clock(self, game_no, clocks):
+        self.append(clock_record(game_no, clocks))
+
+    def record_end(self, game_no, result):
+        self.append(end_record(game_no, result))
+
+    async def run(self):
+        """Group commit loop: one write + fsync per interval, snapshots on schedule."""
+        last_snapshot = time.monotonic()
+        while not self.closing:
+            try:
+                await asyncio.wait_for(self.wakeup.wait(), self.commit_interval)
+            except asyncio.TimeoutError:
+                pass
+            await self.commit()
+            if self.snapshot_interval and time.monotonic() - last_snapshot >= self.snapshot_interval:
+                await self.snapshot()
+                last_snapshot = time.monotonic()
+
+    async def commit(self):
+        """Write and fsync everything appended so far."""
+        if not self.buffer:
+            return
+        data = bytes(self.buffer)
+        self.buffer = bytearray()
+        await asyncio.get_running_loop().run_in_executor(None, self.write_and_sync, self.segment, data)
+        self.stats['commits'] += 1
+        self.stats['bytes'] += len(data)
+
+    @staticmethod
+    def write_and_sync(f, data):
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+
+    async def snapshot(self):
+        """Rotate to a new segment and snapshot the games in progress at that instant."""
+        # Capturing the games and swapping the buffer happen without yielding,
+        # so every record is either in the snapshot or in the new segment.
+        games = self.snapshot_source()
+        pending = bytes(self.buffer)
+        self.buffer = bytearray()
+        old = self.segment
+        self.sequence += 1
+        sequence = self.sequence
+        loop = asyncio.get_running_loop()
+        if old is not None:
+            if pending:
+                await loop.run_in_executor(None, self.write_and_sync, old, pending)
+            old.close()
+        self.segment = open(self.path("segment", sequence), "ab")
+        data = b"".join(snapshot_records(game) for game in games)
+        await loop.run_in_executor(None, self.write_snapshot, sequence, data)
+        self.stats['snapshots'] += 1
+
+    def write_snapshot(self, sequence, data):
+        """Write a snapshot atomically, then drop the files it supersedes."""
+        path = self.path("snapshot", sequence)
+        with open(path + ".tmp", "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(path + ".tmp", path)
+        segments, snapshots = self.listing()
+        for old in segments:
+            if old < sequence:
+                os.remove(self.path("segment", old))
+        for old in snapshots:
+            if old < sequence:
+                os.remove(self.path("snapshot", old))
+
+    async def close(self):
+        """Commit whatever is buffered and stop the commit task."""
+        self.closing = True
+        if self.flusher is not None:
+            self.wakeup.set()
+            await self.flusher
+        await self.commit()
+        if self.segment is not None:
+            self.segment.close()
+            self.segment = None
+
+    def report(self):
+        return (f"records={self.stats['records']} commits={self.stats['commits']} "
+                f"bytes={self.stats['bytes']} snapshots={self.stats['snapshots']}")
@@ -0,0 +1,262 @@
+"""Load driver: many scripted players and spectators against one server.
+
+Starts server.py (unless --no-server is given) and keeps --games games running
+at once. Each game replays the next game of a PGN corpus (or a random legal
+game when no --pgn is given) between two headless players, watched by
+--spectators-per-game headless spectators. If the PGN game ended without mate
+or a draw the server recognises, the side to move resigns after the last move.
+
+Reports move round-trip latency (mover sends until its own move delta
+returns), broadcast fan-out latency (mover sends until each spectator has the
+delta), and the server's CPU time and memory per connection. --json writes the
+same numbers to a file so runs can be compared as a regression benchmark.
+
+    python loadtest.py --games 200 --spectators-per-game 5 --pgn games.pgn --duration 30 --json run.json
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import subprocess
+import sys
+import time
+
+import chess.pgn
+
+import server
+from bench_moves import random_games
+from bench_server import server_rss_kib
+from headless import connect
+
+
+def load_corpus(path, limit):
+    """UCI move lists of up to `limit` standard-start games from a PGN file."""
+    games = []
+    with open(path, encoding="utf-8", errors="replace") as f:
+        while len(games) < limit:
+            game = chess.pgn.read_game(f)
+            if game is None:
+                break
+            if "FEN" in game.headers or game.errors:
+                continue
+            moves = [move.uci() for move in game.mainline_moves()]
+            if moves:
+                games.append(moves)
+    return games
+
+def server_cpu_seconds(pid):
+    """User + system CPU time of a process, or None where /proc is missing."""
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            fields = f.read().rsplit(")", 1)[1].split()
+    except OSError:
+        return None
+    return (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+
+def percentiles(samples):
+    """p50/p90/p99/max of a list of seconds, in milliseconds."""
+    if not samples:
+        return None
+    ms = sorted(x * 1000 for x in samples)
+    pick = lambda q: round(ms[min(len(ms) - 1, int(len(ms) * q))], 3)
+    return {'count': len(ms), 'p50': pick(0.5), 'p90': pick(0.9), 'p99': pick(0.99), 'max': round(ms[-1], 3)}
+
+
+class Load:
+    """Shared counters and samples for one run."""
+
+    def __init__(self, args):
+        self.args = args
+        self.corpus = None
+        self.next_game = itertools.count()
+        self.round_trips = []
+        self.fan_out = []
+        self.moves = 0
+        self.games = 0
+        self.errors = 0
+        self.connections = 0
+        self.peak_connections = 0
+        self.peak_rss_kib = None
+
+    def opened(self, count):
+        self.connections += count
+        self.peak_connections = max(self.peak_connections, self.connections)
+
+    async def watch(self, spectator, sent):
+        """Record the fan-out latency of every move delta until the game ends."""
+        try:
+            while spectator.result is None:
+                message = await spectator.recv()
+                if message.startswith("move:"):
+                    ply = int(message.split(":", 2)[1])
+                    if ply in sent:
+                        self.fan_out.append(time.perf_counter() - sent[ply])
+        except ConnectionError:
+            pass
+
+    async def play(self, room_id, slot, moves, deadline):
+        """One game from the corpus: two players, a few spectators."""
+        args = self.args
+        white = await connect(args.host, args.port, f"w{slot}", room_id, "p")
+        black = await connect(args.host, args.port, f"b{slot}", room_id, "p")
+        spectators = await asyncio.gather(*(connect(args.host, args.port, f"s{slot}-{i}", room_id, "s")
+                                            for i in range(args.spectators_per_game)))
+        clients = [white, black] + list(spectators)
+        self.opened(len(clients))
+        sent = {}  # ply -> when the mover sent it
+        watchers = [asyncio.create_task(self.watch(s, sent)) for s in spectators]
+        sides = {chess.WHITE: white, chess.BLACK: black}
+        board = chess.Board()
+        try:
+            for uci in moves:
+                if time.perf_counter() >= deadline:
+                    break
+                mover = board.turn
+                board.push_uci(uci)
+                delta = f"move:{board.ply()}:"
+                sent[board.ply()] = start = time.perf_counter()
+                sides[mover].send(uci)
+                await sides[mover].wait_for(delta)
+                self.round_trips.append(time.perf_counter() - start)
+                self.moves += 1
+                await sides[not mover].wait_for(delta)
+                if args.think:
+                    await asyncio.sleep(args.think)
+            if not board.is_game_over():
+                sides[board.turn].send("resign")
+            await asyncio.wait_for(white.wait_for("Game over:"), 10)
+            if watchers:
+                await asyncio.wait(watchers, timeout=10)
+            self.games += 1
+        except (ConnectionError, asyncio.TimeoutError):
+            self.errors += 1
+        finally:
+            for task in watchers:
+                task.cancel()
+            for client in clients:
+                client.close()
+            self.opened(-len(clients))
+
+    async def slot(self, slot, deadline):
+        """Play corpus games back to back until the deadline."""
+        for number in itertools.count():
+            if time.perf_counter() >= deadline:
+                break
+            moves = self.corpus[next(self.next_game) % len(self.corpus)]
+            try:
+                await self.play(f"load-{slot}-{number}", slot, moves, deadline)
+            except (OSError, ConnectionError):
+                self.errors += 1
+                await asyncio.sleep(0.1)
+
+async def run(args):
+    load = Load(args)
+    if args.pgn:
+        load.corpus = load_corpus(args.pgn, args.corpus_size)
+        print(f"Loaded {len(load.corpus)} games from {args.pgn}")
+    else:
+        load.corpus = random_games(args.corpus_size, 160, args.seed)
+        print(f"Generated {len(load.corpus)} random games")
+
+    proc = None
+    if not args.no_server:
+        proc = subprocess.Popen([sys.executable, os.path.join(os.path.dirname(__file__), "server.py"),
+                                 "--host", args.host, "--port", str(args.port), "--resume-grace", "0"],
+                                stdout=subprocess.DEVNULL)
+        if hasattr(os, "sched_setaffinity"):
+            os.sched_setaffinity(proc.pid, {0})
+    try:
+        await asyncio.sleep(1.0)
+        pid = proc.pid if proc else None
+        rss_before = server_rss_kib(pid) if pid else None
+        cpu_before = server_cpu_seconds(pid) if pid else None
+
+        print(f"Running {args.games} games with {args.spectators_per_game} spectators each "
+              f"for {args.duration}s against {args.host}:{args.port}...")
+        start = time.perf_counter()
+        deadline = start + args.duration
+        sampler = asyncio.create_task(sample_rss(pid, load)) if pid else None
+        await asyncio.gather(*(load.slot(i, deadline) for i in range(args.games)))
+        elapsed = time.perf_counter() - start
+        cpu_after = server_cpu_seconds(pid) if pid else None
+        if sampler:
+            sampler.cancel()
+
+        results = {
+            'config': {k: v for k, v in vars(args).items() if k != 'json'},
+            'elapsed_s': round(elapsed, 3),
+            'games_completed': load.games,
+            'moves': load.moves,
+            'moves_per_s': round(load.moves / elapsed, 1),
+            'errors': load.errors,
+            'peak_connections': load.peak_connections,
+            'move_round_trip_ms': percentiles(load.round_trips),
+            'fan_out_ms': percentiles(load.fan_out),
+        }
+        if cpu_before is not None and cpu_after is not None:
+            cpu = cpu_after - cpu_before
+            results['server_cpu_s'] = round(cpu, 3)
+            results['server_cpu_percent'] = round(100 * cpu / elapsed, 1)
+            if load.moves:
+                results['server_cpu_us_per_move'] = round(cpu / load.moves * 1e6, 1)
+            if load.peak_connections:
+                results['server_cpu_ms_per_connection_s'] = round(
+                    cpu * 1000 / (load.peak_connections * elapsed), 3)
+        if rss_before is not None and load.peak_rss_kib is not None and load.peak_connections:
+            results['server_rss_peak_mib'] = round(load.peak_rss_kib / 1024, 1)
+            results['server_rss_bytes_per_connection'] = round(
+                (load.peak_rss_kib - rss_before) * 1024 / load.peak_connections)
+        report(results)
+        if args.json:
+            with open(args.json, "w") as f:
+                json.dump(results, f, indent=2)
+            print(f"Results written to {args.json}")
+    finally:
+        if proc:
+            proc.terminate()
+            proc.wait()
+
+async def sample_rss(pid, load):
+    """Track the server's peak RSS while the load runs."""
+    while True:
+        rss = server_rss_kib(pid)
+        if rss is not None and (load.peak_rss_kib is None or rss > load.peak_rss_kib):
+            load.peak_rss_kib = rss
+        await asyncio.sleep(0.5)
+
+def report(results):
+    print(f"Games completed: {results['games_completed']}, moves: {results['moves']} "
+          f"({results['moves_per_s']}/s), errors: {results['errors']}, "
+          f"peak connections: {results['peak_connections']}")
+    for key, label in (('move_round_trip_ms', "Move round trip"), ('fan_out_ms', "Broadcast fan-out")):
+        p = results[key]
+        if p:
+            print(f"{label}: p50={p['p50']}ms p90={p['p90']}ms p99={p['p99']}ms max={p['max']}ms ({p['count']} samples)")
+    if 'server_cpu_s' in results:
+        print(f"Server CPU: {results['server_cpu_percent']}% of a core, "
+              f"{results.get('server_cpu_us_per_move', 0)}us per move, "
+              f"{results.get('server_cpu_ms_per_connection_s', 0)}ms per connection-second")
+    if 'server_rss_peak_mib' in results:
+        print(f"Server RSS: peak {results['server_rss_peak_mib']} MiB, "
+              f"{results['server_rss_bytes_per_connection']} bytes per connection")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1", help="server address (default: %(default)s)")
+    parser.add_argument("--port", type=int, default=5650, help="server port (default: %(default)s)")
+    parser.add_argument("--no-server", action="store_true", help="use a server that is already running")
+    parser.add_argument("--games", type=int, default=100, help="games played at the same time")
+    parser.add_argument("--spectators-per-game", type=int, default=5)
+    parser.add_argument("--pgn", help="PGN corpus to replay (default: random legal games)")
+    parser.add_argument("--corpus-size", type=int, default=1000, help="games to load or generate")
+    parser.add_argument("--think", type=float, default=0.0, help="seconds each player waits before moving")
+    parser.add_argument("--duration", type=float, default=20.0, help="seconds of load")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", help="also write the results to this JSON file")
+    args = parser.parse_args()
+    server.raise_fd_limit()
+    asyncio.run(run(args))
+
+if __name__ == "__main__":
+    main()
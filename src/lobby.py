@@ -0,0 +1,93 @@
+"""Matchmaking: pair waiting players by rating and time control.
+
+Seekers wait in buckets keyed by (time control, rating // BUCKET_WIDTH); each
+bucket is an insertion-ordered dict, so the oldest seeker comes first and any
+seeker can leave in O(1). A new seeker looks at its own bucket and then the
+neighbouring ones, nearest first, out to `window` rating points, and takes the
+oldest seeker in the first non-empty bucket. Joining, pairing and leaving
+therefore cost O(window / BUCKET_WIDTH), however many players are waiting.
+Because ratings are compared by bucket, two paired ratings can differ by up
+to window + BUCKET_WIDTH - 1.
+"""
+import collections
+
+from clock import TimeControl
+
+BUCKET_WIDTH = 25  # rating points per bucket
+MATCH_WINDOW = 200  # default maximum rating distance, in points
+
+
+def parse_seek(text):
+    """Parse the matchmaking role answer 'm:<rating>' or 'm:<rating>:<time control>'.
+
+    Returns (rating, TimeControl or None for the server default); raises ValueError.
+    """
+    parts = text.split(":")
+    if parts[0] != "m" or len(parts) not in (2, 3):
+        raise ValueError(f"invalid seek {text!r}")
+    rating = int(parts[1])
+    if rating < 0:
+        raise ValueError("rating must not be negative")
+    return rating, (TimeControl.parse(parts[2]) if len(parts) == 3 else None)
+
+
+class Seeker:
+    """A player waiting for an opponent."""
+
+    __slots__ = ("conn", "name", "rating", "time_control", "matched", "waiting_since")
+
+    def __init__(self, conn, name, rating, time_control, matched, waiting_since):
+        self.conn = conn
+        self.name = name
+        self.rating = rating
+        self.time_control = time_control
+        self.matched = matched  # Future resolved with the room once paired
+        self.waiting_since = waiting_since
+
+
+class MatchQueue:
+    """Waiting pool bucketed by time control and rating."""
+
+    def __init__(self, window=MATCH_WINDOW):
+        self.reach = window // BUCKET_WIDTH  # Neighbouring buckets searched on each side
+        self.buckets = {}  # (time control, bucket) -> {Seeker: None}, oldest first
+        self.waiting = 0
+        self.stats = collections.Counter()
+
+    def key(self, seeker):
+        return seeker.time_control, seeker.rating // BUCKET_WIDTH
+
+    def join(self, seeker):
+        """Return an opponent for `seeker` (removing it from the pool), or queue `seeker` and return None."""
+        self.stats['joins'] += 1
+        time_control, bucket = self.key(seeker)
+        for distance in range(self.reach + 1):
+            for candidate in {bucket - distance, bucket + distance}:
+                waiting = self.buckets.get((time_control, candidate))
+                if waiting:
+                    opponent = next(iter(waiting))
+                    self.remove((time_control, candidate), opponent)
+                    self.stats['pairs'] += 1
+                    return opponent
+        self.buckets.setdefault((time_control, bucket), {})[seeker] = None
+        self.waiting += 1
+        return None
+
+    def leave(self, seeker):
+        """Take a seeker out of the pool (e.g. it disconnected before being paired)."""
+        if self.remove(self.key(seeker), seeker):
+            self.stats['leaves'] += 1
+
+    def remove(self, key, seeker):
+        waiting = self.buckets.get(key)
+        if waiting is None or seeker not in waiting:
+            return False
+        del waiting[seeker]
+        if not waiting:
+            del self.buckets[key]
+        self.waiting -= 1
+        return True
+
+    def report(self):
+        return (f"waiting={self.waiting} joins={self.stats['joins']} "
+                f"pairs={self.stats['pairs']} leaves={self.stats['leaves']}")
@@ -0,0 +1,243 @@
+"""Server metrics in the Prometheus text format, plus a sampling profiler.
+
+Counters and histograms are plain objects updated inline on the event loop
+thread, so recording a value is an addition or two (plus a perf_counter call
+around a timed section) and needs no locking. Values that other parts of the
+server already keep (queue depths, lobby size, journal counters) are read by
+collector functions when the endpoint is scraped instead of being mirrored on
+every change.
+
+The endpoint (server.py --metrics-port) is a minimal HTTP server meant for
+localhost or a private network:
+
+    GET /metrics          every metric, Prometheus text exposition format 0.0.4
+    GET /profile/start    start sampling the event loop thread's stack
+    GET /profile/stop     stop sampling
+    GET /profile          samples so far as collapsed stacks, one
+                          'file:function;file:function <count>' line per stack
+                          (flamegraph.pl and speedscope read this)
+"""
+import asyncio
+import bisect
+import collections
+import os
+import sys
+import threading
+import time
+
+# Histogram upper bounds in seconds, 10us to 1s
+LATENCY_BUCKETS = (0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005,
+                   0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+SAMPLE_INTERVAL = 0.005  # seconds between profiler samples
+LOOP_LAG_INTERVAL = 0.1  # seconds between event loop lag probes
+
+
+class Counter:
+    """Monotonic count."""
+
+    __slots__ = ("name", "help", "value")
+
+    def __init__(self, name, help):
+        self.name = name
+        self.help = help
+        self.value = 0
+
+    def inc(self, amount=1):
+        self.value += amount
+
+    def render(self):
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter",
+                f"{self.name} {self.value}"]
+
+
+class Histogram:
+    """Distribution of observed values over fixed buckets.
+
+    Only the bucket an observation falls in is incremented; the cumulative
+    counts Prometheus expects are summed when rendering.
+    """
+
+    __slots__ = ("name", "help", "buckets", "counts", "sum")
+
+    def __init__(self, name, help, buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # The last slot is +Inf
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        total = 0
+        for bound, count in zip(self.buckets + ("+Inf",), self.counts):
+            total += count
+            lines.append(f'{self.name}_bucket{{le="{bound}"}} {total}')
+        lines.append(f"{self.name}_sum {self.sum}")
+        lines.append(f"{self.name}_count {total}")
+        return lines
+
+
+class TimedLock(asyncio.Lock):
+    """asyncio.Lock that records how long each holder waited for it and held it."""
+
+    def __init__(self, wait, hold, contended):
+        super().__init__()
+        self.wait = wait
+        self.hold = hold
+        self.contended = contended
+        self.acquired_at = 0.0
+
+    async def acquire(self):
+        start = time.perf_counter()
+        if self.locked():
+            self.contended.inc()
+        await super().acquire()
+        self.acquired_at = time.perf_counter()
+        self.wait.observe(self.acquired_at - start)
+        return True
+
+    def release(self):
+        self.hold.observe(time.perf_counter() - self.acquired_at)
+        super().release()
+
+
+class SamplingProfiler:
+    """Samples one thread's Python stack from a background thread.
+
+    Each sample takes the GIL for a moment, so while it runs the profiler costs
+    a few percent of a core at the default rate; stopped, it costs nothing.
+    """
+
+    def __init__(self, thread_id, interval=SAMPLE_INTERVAL):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.samples = collections.Counter()  # collapsed stack -> samples
+        self.samples_lock = threading.Lock()
+        self.stopping = threading.Event()
+        self.thread = None
+
+    @property
+    def running(self):
+        return self.thread is not None
+
+    def start(self):
+        """Start a fresh profile; returns False if one is already running."""
+        if self.thread is not None:
+            return False
+        with self.samples_lock:
+            self.samples.clear()
+        self.stopping.clear()
+        self.thread = threading.Thread(target=self.run, name="profiler", daemon=True)
+        self.thread.start()
+        return True
+
+    def stop(self):
+        """Stop sampling, keeping the samples; returns False if it was not running."""
+        if self.thread is None:
+            return False
+        self.stopping.set()
+        self.thread.join()
+        self.thread = None
+        return True
+
+    def run(self):
+        while not self.stopping.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                frame = frame.f_back
+            with self.samples_lock:
+                self.samples[";".join(reversed(stack))] += 1
+
+    def collapsed(self):
+        """The samples as collapsed-stack text, most frequent first."""
+        with self.samples_lock:
+            samples = self.samples.most_common()
+        return "".join(f"{stack} {count}\n" for stack, count in samples)
+
+
+class Metrics:
+    """Registry of counters, histograms and scrape-time collectors, and its HTTP endpoint."""
+
+    def __init__(self):
+        self.metrics = []
+        self.collectors = []
+        self.profiler = None  # Created by serve(), on the event loop thread it samples
+
+    def counter(self, name, help):
+        counter = Counter(name, help)
+        self.metrics.append(counter)
+        return counter
+
+    def histogram(self, name, help, buckets=LATENCY_BUCKETS):
+        histogram = Histogram(name, help, buckets)
+        self.metrics.append(histogram)
+        return histogram
+
+    def collector(self, collect):
+        """Register collect(), which returns (name, 'counter' or 'gauge', help, value) tuples at scrape time."""
+        self.collectors.append(collect)
+        return collect
+
+    def render(self):
+        """Every metric in the Prometheus text exposition format."""
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        for collect in self.collectors:
+            for name, kind, help, value in collect():
+                lines.extend((f"# HELP {name} {help}", f"# TYPE {name} {kind}", f"{name} {value}"))
+        return "\n".join(lines) + "\n"
+
+    async def watch_loop_lag(self, histogram, interval=LOOP_LAG_INTERVAL):
+        """Record how late the event loop wakes a task that sleeps for `interval` seconds."""
+        loop = asyncio.get_running_loop()
+        while True:
+            start = loop.time()
+            await asyncio.sleep(interval)
+            histogram.observe(max(0.0, loop.time() - start - interval))
+
+    async def serve(self, host, port):
+        """Start the HTTP endpoint; returns the asyncio server."""
+        self.profiler = SamplingProfiler(threading.get_ident())
+        return await asyncio.start_server(self.handle_request, host, port)
+
+    def route(self, path):
+        """(status, content type, body) for one GET request."""
+        if path == "/metrics":
+            return "200 OK", "text/plain; version=0.0.4; charset=utf-8", self.render()
+        if path == "/profile/start":
+            started = self.profiler.start()
+            return "200 OK", "text/plain", "profiler started\n" if started else "profiler already running\n"
+        if path == "/profile/stop":
+            stopped = self.profiler.stop()
+            return "200 OK", "text/plain", "profiler stopped\n" if stopped else "profiler not running\n"
+        if path == "/profile":
+            return "200 OK", "text/plain", self.profiler.collapsed()
+        return "404 Not Found", "text/plain", "not found\n"
+
+    async def handle_request(self, reader, writer):
+        try:
+            request = (await reader.readline()).decode("latin-1").split()
+            while (await reader.readline()).strip():
+                pass  # Headers are not needed
+            if len(request) < 2 or request[0] != "GET":
+                status, content_type, body = "405 Method Not Allowed", "text/plain", "GET only\n"
+            else:
+                status, content_type, body = self.route(request[1].split("?", 1)[0])
+            data = body.encode()
+            writer.write(f"HTTP/1.1 {status}\r\nContent-Type: {content_type}\r\n"
+                         f"Content-Length: {len(data)}\r\nConnection: close\r\n\r\n".encode() + data)
+            await writer.drain()
+        except (ConnectionError, ValueError):
+            pass
+        finally:
+            writer.close()
@@ -0,0 +1,107 @@
+"""Wire protocol shared by the server and the clients.
+
+Every message is one line of UTF-8 text terminated by a newline. TCP is a byte
+stream, so a single read may hold several messages or only part of one;
+FrameDecoder reassembles the stream into whole messages no matter how it was
+split.
+"""
+import collections
+
+DEFAULT_PORT = 5555
+MAX_FRAME = 64 * 1024  # Longest message we accept, in bytes
+
+
+class ProtocolError(Exception):
+    """Raised when the peer sends something that cannot be framed."""
+
+
+def encode(message):
+    """Return the wire form of one message."""
+    # A newline inside a message would split it in two on the other side.
+    return message.replace("\n", " ").encode() + b"\n"
+
+
+def parse_move(message):
+    """Split 'move:<ply>:<uci>:<white_ms>,<black_ms>' into (ply, uci, (white_ms, black_ms)).
+
+    Raises ValueError if the message is malformed.
+    """
+    _, ply, uci, clocks = message.split(":", 3)
+    return int(ply), uci, parse_clocks(clocks)
+
+def parse_clock(message):
+    """Split 'clock:<white_ms>,<black_ms>:<white|black|->' into ((white_ms, black_ms), running).
+
+    running is 'white', 'black' or None while the clock is stopped.
+    """
+    _, clocks, running = message.split(":", 2)
+    return parse_clocks(clocks), (running if running in ('white', 'black') else None)
+
+def parse_clocks(text):
+    white_ms, black_ms = text.split(",")
+    return int(white_ms), int(black_ms)
+
+
+class FrameDecoder:
+    """Streaming decoder: feed it raw bytes, get back the complete messages."""
+
+    def __init__(self, max_frame=MAX_FRAME):
+        self.max_frame = max_frame
+        self.buffer = bytearray()
+
+    def feed(self, data):
+        """Add received bytes and return a list of the messages they complete."""
+        self.buffer += data
+        if b"\n" not in data:
+            if len(self.buffer) > self.max_frame:
+                raise ProtocolError(f"message longer than {self.max_frame} bytes")
+            return []
+        *lines, rest = self.buffer.split(b"\n")
+        self.buffer = bytearray(rest)
+        # A line completed here may have started in earlier reads, so every line is checked.
+        if len(self.buffer) > self.max_frame or any(len(line) > self.max_frame for line in lines):
+            raise ProtocolError(f"message longer than {self.max_frame} bytes")
+        try:
+            messages = [line.decode().strip() for line in lines]
+        except UnicodeDecodeError as e:
+            raise ProtocolError(f"invalid UTF-8: {e}") from e
+        return [m for m in messages if m]  # Blank lines carry nothing
+
+
+class FramedSocket:
+    """Blocking socket wrapper for clients: framed recv() and a buffered writer.
+
+    write() only queues a message; flush() sends everything queued with a
+    single sendall(). send() is write() followed by flush().
+    """
+
+    def __init__(self, sock):
+        self.sock = sock
+        self.decoder = FrameDecoder()
+        self.incoming = collections.deque()
+        self.outgoing = []
+
+    def recv(self, bufsize=65536):
+        """Return the next message, or '' once the server has closed the connection."""
+        while not self.incoming:
+            data = self.sock.recv(bufsize)
+            if not data:
+                return ""
+            self.incoming.extend(self.decoder.feed(data))
+        return self.incoming.popleft()
+
+    def write(self, message):
+        self.outgoing.append(encode(message))
+
+    def flush(self):
+        if self.outgoing:
+            data = b"".join(self.outgoing)
+            self.outgoing = []
+            self.sock.sendall(data)
+
+    def send(self, message):
+        self.write(message)
+        self.flush()
+
+    def close(self):
+        self.sock.close()
@@ -0,0 +1,61 @@
+"""Upstream side of a relay node.
+
+A server started with --relay HOST:PORT owns no games. For every room its
+spectators ask for, it opens one spectator connection to the upstream server
+(which may itself be a relay) and re-broadcasts what arrives there to its own
+spectators. The upstream server therefore writes each move once per relay,
+however many spectators sit behind it, and relays can be chained into a tree.
+"""
+import asyncio
+import collections
+
+import protocol
+
+RELAY_NAME = "relay"  # Name the relay gives upstream
+
+
+def parse_address(text):
+    """'host:port' -> (host, port)."""
+    host, _, port = text.rpartition(":")
+    if not host or not port.isdigit():
+        raise ValueError(f"invalid address {text!r} (expected host:port)")
+    return host, int(port)
+
+
+class Upstream:
+    """Spectator connection to the upstream server for one room."""
+
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+        self.decoder = protocol.FrameDecoder()
+        self.incoming = collections.deque()
+
+    @classmethod
+    async def open(cls, address, room_id):
+        """Connect and join `room_id` as a spectator; returns the Upstream or raises ConnectionError."""
+        reader, writer = await asyncio.open_connection(*address)
+        upstream = cls(reader, writer)
+        for answer in (RELAY_NAME, room_id, 's'):
+            await upstream.recv()  # prompt
+            upstream.send(answer)
+        reply = await upstream.recv()
+        if reply != "You are a spectator":
+            upstream.close()
+            raise ConnectionError(f"upstream refused the relay: {reply}")
+        return upstream
+
+    async def recv(self):
+        """Next message from upstream; raises ConnectionError once it has closed."""
+        while not self.incoming:
+            data = await self.reader.read(65536)
+            if not data:
+                raise ConnectionError("upstream closed the connection")
+            self.incoming.extend(self.decoder.feed(data))
+        return self.incoming.popleft()
+
+    def send(self, message):
+        self.writer.write(protocol.encode(message))
+
+    def close(self):
+        self.writer.close()
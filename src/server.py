@@ -1,200 +1,1102 @@
-import socket
-import threading
+import argparse
+import asyncio
+import collections
+import itertools
+import secrets
 import chess
-import os
+import chess.polyglot
 import time
 
-# Initialize game state and timers
-board = chess.Board()
-lock = threading.Lock()
-players = {'white': None, 'black': None}
-spectators = []
-current_turn = chess.WHITE
-white_time = 600  # seconds
-black_time = 600  # seconds
-last_move_time = time.time()
-
-def safe_send(sock, message):
-    """Helper function to send a message and handle errors."""
-    try:
-        sock.send(message.encode())
-    except Exception:
-        pass
+import protocol
+from analysis import AnalysisService, EVAL_DEPTHS
+from archive import ARCHIVE_SIZE, GameArchive
+from clock import GameClock, TimeControl
+from export import PgnExport
+from journal import COMMIT_INTERVAL, SNAPSHOT_INTERVAL, Journal, JournaledGame, encode_move
+from lobby import MATCH_WINDOW, MatchQueue, Seeker, parse_seek
+from metrics import Metrics, TimedLock
+from relay import Upstream, parse_address
+
+try:
+    import resource  # Not available on Windows
+except ImportError:
+    resource = None
+
+DEFAULT_ROOM = "default"
+TIME_CONTROL = TimeControl(600)  # Default for new rooms; see --time-control
+SEND_QUEUE_LIMIT = 256  # frames queued per connection before it counts as slow
+SLOW_CONSUMER_POLICY = 'snapshot'  # 'snapshot' or 'disconnect'
+RESUME_GRACE = 30.0  # seconds a disconnected player's seat is held, clock running, before they forfeit
+RESUME_BUFFER = 64  # recent move deltas kept per room for resuming players
+LEGAL_HINTS = False  # send the player to move its legal moves after every move (see --legal-hints)
+UPSTREAM = None  # (host, port) of the server this one relays (see --relay); None for a game server
+
+# Every open connection, and counters for the outbound queues
+connections = set()
+send_stats = collections.Counter()
+
+# Shared engine pool for spectator evaluations (None unless --engine is given)
+analysis = None
+
+# Append-only game journal (None unless --journal is given)
+journal = None
+
+# Finished games, packed (see archive.py)
+archive = GameArchive()
+
+# PGN file finished games are appended to (None unless --pgn is given)
+pgn_export = None
+
+# Counters and latency histograms for the metrics endpoint (see metrics.py)
+metrics = Metrics()
+moves_applied = metrics.counter("chess_moves_total", "Moves accepted")
+moves_rejected = metrics.counter("chess_invalid_moves_total", "Moves rejected as illegal or malformed")
+games_finished = metrics.counter("chess_games_finished_total", "Games that ended with a result")
+move_validation = metrics.histogram("chess_move_validation_seconds", "Time to check one move for legality")
+move_latency = metrics.histogram("chess_move_seconds",
+                                 "Time to apply an accepted move: validation, clock, journal, broadcast, game-over check")
+lock_wait = metrics.histogram("chess_room_lock_wait_seconds", "Time spent waiting for a room lock")
+lock_hold = metrics.histogram("chess_room_lock_hold_seconds", "Time a room lock was held")
+lock_contended = metrics.counter("chess_room_lock_contended_total", "Room lock acquisitions that had to wait")
+broadcast_latency = metrics.histogram("chess_broadcast_seconds", "Time to queue one message for every client in a room")
+broadcast_frames = metrics.counter("chess_broadcast_frames_total", "Frames queued by broadcasts")
+flag_timer_lag = metrics.histogram("chess_flag_timer_lag_seconds",
+                                   "How late flag timers ran after the clock deadline, including the lock wait")
+loop_lag = metrics.histogram("chess_event_loop_lag_seconds", "How late the event loop wakes a sleeping task")
+send_batch = metrics.histogram("chess_send_batch_frames",
+                               "Frames a connection had queued when its writer flushed them (send-queue depth)",
+                               buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256, 1024))
+
+
+def superseded_by_snapshot(frame):
+    """Whether a queued frame is covered by a FEN and clock snapshot sent after it."""
+    return frame.startswith((b"move:", b"clock:", b"eval:")) or frame.count(b"/") == 7
+
+
+class Connection:
+    """One client connection: framed reads and a bounded outbound queue.
+
+    send() and send_frame() never block: they append an encoded frame to this
+    connection's queue and wake its writer task, which writes everything
+    queued so far with one transport write and then waits for the socket to
+    drain. A client that cannot keep up therefore only delays itself. If its
+    queue reaches SEND_QUEUE_LIMIT frames, SLOW_CONSUMER_POLICY decides what
+    happens: 'snapshot' drops the backlog and resends the current position
+    (FEN) instead, 'disconnect' drops the client.
+    """
+
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+        self.decoder = protocol.FrameDecoder()
+        self.incoming = collections.deque()
+        self.outgoing = collections.deque()
+        self.wakeup = asyncio.Event()
+        self.room = None  # Set once the client has joined a room
+        self.snapshot_at = None  # Queue index for the resync snapshot after dropping frames
+        self.closing = False
+        self.closed = False
+        connections.add(self)
+        self.writer_task = asyncio.get_running_loop().create_task(self.write_loop())
 
-def format_time(seconds):
-    """Return time in MM:SS format."""
-    minutes = int(seconds) // 60
-    secs = int(seconds) % 60
-    return f"{minutes:02}:{secs:02}"
+    async def recv(self):
+        """Return the next message, or '' on EOF."""
+        while not self.incoming:
+            data = await self.reader.read(65536)
+            if not data:
+                return ""
+            self.incoming.extend(self.decoder.feed(data))
+        return self.incoming.popleft()
 
-def timer_thread():
-    global white_time, black_time, last_move_time, current_turn
+    def send(self, message):
+        """Queue a message; errors on a dead connection are ignored."""
+        self.send_frame(protocol.encode(message))
+
+    def send_frame(self, frame):
+        """Queue an already-encoded frame (shared between all receivers of a broadcast)."""
+        if self.closing:
+            return
+        if len(self.outgoing) >= SEND_QUEUE_LIMIT:
+            send_stats['overflows'] += 1
+            if SLOW_CONSUMER_POLICY == 'disconnect' or self.room is None:
+                send_stats['slow_disconnects'] += 1
+                self.abort()
+                return
+            # Drop the frames a fresh snapshot (FEN and clock) supersedes; the
+            # writer puts the snapshot where the first of them was, and the
+            # client ignores any move deltas the snapshot already covers.
+            kept = []
+            for f in self.outgoing:
+                if superseded_by_snapshot(f):
+                    if self.snapshot_at is None:
+                        self.snapshot_at = len(kept)
+                else:
+                    kept.append(f)
+            if len(kept) >= SEND_QUEUE_LIMIT:  # Nothing left to drop
+                send_stats['slow_disconnects'] += 1
+                self.abort()
+                return
+            send_stats['frames_dropped'] += len(self.outgoing) - len(kept)
+            self.outgoing.clear()
+            self.outgoing.extend(kept)
+        self.outgoing.append(frame)
+        if len(self.outgoing) > send_stats['max_queue_depth']:
+            send_stats['max_queue_depth'] = len(self.outgoing)
+        self.wakeup.set()
+
+    async def write_loop(self):
+        """Writer task: flush the queue in batches until the connection closes."""
+        try:
+            while True:
+                await self.wakeup.wait()
+                self.wakeup.clear()
+                if self.snapshot_at is not None:
+                    send_stats['snapshots_resent'] += 1
+                    self.outgoing.insert(self.snapshot_at, protocol.encode(self.room.clock_message()))
+                    self.outgoing.insert(self.snapshot_at, protocol.encode(self.room.board.fen()))
+                    self.snapshot_at = None
+                if self.outgoing:
+                    send_batch.observe(len(self.outgoing))
+                    data = b"".join(self.outgoing)
+                    self.outgoing.clear()
+                    self.writer.write(data)
+                    await self.writer.drain()
+                if self.closing and not self.outgoing:
+                    break
+        except (ConnectionError, asyncio.CancelledError):
+            pass
+        finally:
+            self.closed = True
+            connections.discard(self)
+            self.writer.close()
+
+    def close(self):
+        """Stop accepting frames; the writer flushes what is queued, then closes the socket."""
+        if self.closing:
+            return
+        self.closing = True
+        self.wakeup.set()
+
+    def abort(self):
+        """Drop the connection immediately, discarding anything still queued."""
+        self.closing = True
+        self.outgoing.clear()
+        self.writer.transport.abort()
+        self.writer_task.cancel()
+
+
+def send_queue_report():
+    """One-line summary of outbound queue depths across all connections."""
+    depths = [len(c.outgoing) for c in connections]
+    backlogged = sum(1 for d in depths if d)
+    return (f"connections={len(depths)} backlogged={backlogged} "
+            f"queued={sum(depths)} deepest={max(depths, default=0)} "
+            f"max_seen={send_stats['max_queue_depth']} overflows={send_stats['overflows']} "
+            f"dropped={send_stats['frames_dropped']} resyncs={send_stats['snapshots_resent']} "
+            f"slow_disconnects={send_stats['slow_disconnects']}")
+
+@metrics.collector
+def server_gauges():
+    """Scrape-time metrics read from the server's own state and counters."""
+    depths = [len(c.outgoing) for c in connections]
+    values = [
+        ("chess_connections", "gauge", "Open client connections", len(depths)),
+        ("chess_rooms", "gauge", "Open rooms", len(rooms)),
+        ("chess_send_queue_frames", "gauge", "Frames queued on all connections", sum(depths)),
+        ("chess_send_queue_deepest_frames", "gauge", "Longest send queue of any connection", max(depths, default=0)),
+        ("chess_send_queue_backlogged_connections", "gauge", "Connections with queued frames",
+         sum(1 for d in depths if d)),
+        ("chess_send_queue_overflows_total", "counter", "Send queues that reached the limit", send_stats['overflows']),
+        ("chess_send_frames_dropped_total", "counter", "Queued frames dropped for slow clients",
+         send_stats['frames_dropped']),
+        ("chess_send_snapshots_resent_total", "counter", "Snapshots sent instead of a dropped backlog",
+         send_stats['snapshots_resent']),
+        ("chess_slow_disconnects_total", "counter", "Clients dropped for being too slow", send_stats['slow_disconnects']),
+        ("chess_archived_games", "gauge", "Finished games in the archive", len(archive)),
+        ("chess_lobby_waiting", "gauge", "Players waiting for an opponent", lobby.waiting),
+        ("chess_lobby_joins_total", "counter", "Players that entered the lobby", lobby.stats['joins']),
+        ("chess_lobby_pairs_total", "counter", "Pairings made by the lobby", lobby.stats['pairs']),
+        ("chess_lobby_leaves_total", "counter", "Players that left the lobby unpaired", lobby.stats['leaves']),
+    ]
+    if journal is not None:
+        values += [(f"chess_journal_{key}_total", "counter", f"Journal {key}", value)
+                   for key, value in journal.stats.items()]
+    if analysis is not None:
+        values += [("chess_analysis_cached_positions", "gauge", "Positions in the evaluation cache", len(analysis.cache))]
+        values += [(f"chess_analysis_{key}_total", "counter", f"Analysis {key.replace('_', ' ')}", analysis.stats[key])
+                   for key in ('analyses', 'cache_hits', 'shared')]
+    return values
+
+async def report_stats(interval):
+    """Print the send-queue summary every `interval` seconds."""
     while True:
-        time.sleep(1)
-        with lock:
-            # Only count down if both players are connected
-            if players['white'] is None or players['black'] is None:
-                last_move_time = time.time()
-                continue
-            now = time.time()
-            elapsed = now - last_move_time
-            if current_turn == chess.WHITE:
-                white_time -= elapsed
-                if white_time <= 0:
-                    for p in [players['white'], players['black']] + spectators:
-                        if p:
-                            safe_send(p, "Game over: Black wins by timeout")
-                    print("Game over: Black wins by timeout")
-                    os._exit(0)
-            else:
-                black_time -= elapsed
-                if black_time <= 0:
-                    for p in [players['white'], players['black']] + spectators:
-                        if p:
-                            safe_send(p, "Game over: White wins by timeout")
-                    print("Game over: White wins by timeout")
-                    os._exit(0)
-            last_move_time = now
-            timer_msg = f"timer:{format_time(white_time)},{format_time(black_time)}"
-            for p in [players['white'], players['black']] + spectators:
-                if p:
-                    safe_send(p, timer_msg)
-
-def handle_client(client_socket):
-    global current_turn, last_move_time
-    # Ask for user's name
-    safe_send(client_socket, "Enter your name:")
-    name = client_socket.recv(1024).decode().strip()
-
-    # Ask for role
-    safe_send(client_socket, "Are you a player or spectator? (p/s)")
-    role = client_socket.recv(1024).decode().strip().lower()
+        await asyncio.sleep(interval)
+        print(f"[stats] {send_queue_report()}")
+        if analysis is not None:
+            print(f"[stats] analysis {analysis.report()}")
+        if journal is not None:
+            print(f"[stats] journal {journal.report()}")
+        print(f"[stats] archive games={len(archive)}")
+        print(f"[stats] lobby {lobby.report()}")
 
-    if role == 'p':
-        with lock:
-            if players['white'] is None:
-                players['white'] = client_socket
-                safe_send(client_socket, "You are white")
-                print(f"{name} joined as White")
-            elif players['black'] is None:
-                players['black'] = client_socket
-                safe_send(client_socket, "You are black")
-                print(f"{name} joined as Black")
+
+class GameRoom:
+    """State for one game: board, seats, spectators and clocks, guarded by its own lock."""
+
+    def __init__(self, room_id, time_control=None):
+        self.room_id = room_id
+        self.board = chess.Board()
+        self.lock = TimedLock(lock_wait, lock_hold, lock_contended)
+        self.players = {'white': None, 'black': None}
+        self.names = {'white': None, 'black': None}  # Kept after a player leaves, for the archive
+        self.spectators = []
+        self.clock = GameClock(time_control or TIME_CONTROL)
+        self.flag_timer = None  # Event-loop timer armed at the side to move's deadline
+        self.eval_subscribers = set()  # Spectators that asked for engine evaluations
+        self.analysis_task = None  # Deepening analysis of the current position
+        self.game_no = None  # Journal game number, assigned at the first move
+        self.recovered = False  # Restored from the journal and no player has rejoined yet
+        self.tokens = {}  # color -> session token of the player seated there
+        self.held = {}  # color -> grace timer for a disconnected player's seat
+        self.recent_moves = collections.deque(maxlen=RESUME_BUFFER)  # (ply, encoded move frame)
+        self.legal = None  # uci -> Move for the current position, built on first use
+        self.relay_task = None  # Relay mode: task mirroring this room from upstream
+        self.upstream = None  # Relay mode: spectator connection to the upstream server
+        self.upstream_eval = None  # Relay mode: last eval: message received from upstream
+        self.sync_pending = False  # Relay mode: asked upstream for a snapshot after a gap
+        self.synced = False  # Relay mode: the upstream position and clock have arrived
+        self.joining = []  # Relay mode: (connection, name) of spectators waiting for them
+        self.finished = False
+
+    def clients(self):
+        """Return every connected client in the room (players first)."""
+        return [p for p in (self.players['white'], self.players['black']) if p] + self.spectators
+
+    def broadcast(self, message):
+        """Send a message to both players and all spectators.
+
+        The message is encoded once and the same buffer is queued on every
+        connection, so a broadcast never waits on a slow receiver.
+        """
+        start = time.perf_counter()
+        frame = protocol.encode(message)
+        clients = self.clients()
+        for p in clients:
+            p.send_frame(frame)
+        broadcast_frames.inc(len(clients))
+        broadcast_latency.observe(time.perf_counter() - start)
+        return frame
+
+    def color_of(self, conn):
+        """Return 'white', 'black' or None for the given connection."""
+        if self.players['white'] is conn:
+            return 'white'
+        if self.players['black'] is conn:
+            return 'black'
+        return None
+
+    def opponent_of(self, conn):
+        return self.players['black'] if self.players['white'] is conn else self.players['white']
+
+    def seat_player(self, conn):
+        """Give the connection a free color and return it, or None if the game is full."""
+        for color in ('white', 'black'):
+            if self.players[color] is None and color not in self.held:
+                self.players[color] = conn
+                self.recovered = False
+                return color
+        return None
+
+    def issue_token(self, color):
+        """Create the session token a player uses to resume its seat after a disconnect."""
+        old = self.tokens.get(color)
+        if old is not None:
+            sessions.pop(old, None)
+        token = secrets.token_urlsafe(16)
+        self.tokens[color] = token
+        sessions[token] = (self, color)
+        return token
+
+    def hold_seat(self, color):
+        """Keep a disconnected player's seat for RESUME_GRACE seconds. Caller holds the lock."""
+        loop = asyncio.get_running_loop()
+        self.held[color] = loop.call_later(RESUME_GRACE, lambda: loop.create_task(self.grace_expired(color)))
+
+    def reseat_player(self, color, conn):
+        """Give a resuming player its seat back, replacing a connection the server still thinks is alive."""
+        timer = self.held.pop(color, None)
+        if timer is not None:
+            timer.cancel()
+        old = self.players[color]
+        if old is not None and old is not conn:
+            old.abort()
+        self.players[color] = conn
+        self.recovered = False
+
+    async def grace_expired(self, color):
+        """A disconnected player did not come back in time: they lose the game."""
+        async with self.lock:
+            if self.held.pop(color, None) is None or self.finished:
+                return
+            if self.held:
+                self.close()  # Both players are gone
             else:
-                safe_send(client_socket, "Game is full")
-                client_socket.close()
+                self.end_game("Black wins by abandonment" if color == 'white' else "White wins by abandonment")
+
+    def moves_since(self, ply):
+        """Encoded move frames after `ply`, or None if the buffer no longer reaches back that far."""
+        current = self.board.ply()
+        if ply == current:
+            return []
+        if ply > current or not self.recent_moves or self.recent_moves[0][0] > ply + 1:
+            return None
+        return [frame for move_ply, frame in self.recent_moves if move_ply > ply]
+
+    def remove(self, conn):
+        """Drop a connection from its seat or from the spectator list."""
+        color = self.color_of(conn)
+        if color:
+            self.players[color] = None
+        elif conn in self.spectators:
+            self.spectators.remove(conn)
+        self.joining = [(c, name) for c, name in self.joining if c is not conn]
+        if conn in self.eval_subscribers:
+            self.unsubscribe_eval(conn)
+
+    def is_empty(self):
+        # A game restored from the journal waits for its players even if spectators come and go.
+        return not self.clients() and not self.joining and not self.recovered and not self.held
+
+    def greet_spectator(self, conn, name):
+        """Add a spectator and send it the position and the clock. Caller holds the lock."""
+        self.spectators.append(conn)
+        conn.send("You are a spectator")
+        print(f"[{self.room_id}] {name} joined as Spectator")
+        # Send initial board state
+        conn.send(self.board.fen())
+        conn.send(self.clock_message())
+
+    def clock_message(self):
+        """Full clock state: both times in milliseconds and which side's clock is running."""
+        running = ('white' if self.clock.turn == chess.WHITE else 'black') if self.clock.running else '-'
+        return f"clock:{self.clock.state()}:{running}"
+
+    def update_clock(self):
+        """Start or stop the clock to match who is seated, and re-arm the flag timer.
+
+        The clock only runs while both players are connected or within their
+        reconnect grace period. Caller holds the lock.
+        """
+        # A seat held for a reconnecting player counts as occupied.
+        seated = all(self.players[c] is not None or c in self.held for c in ('white', 'black'))
+        if seated and not self.finished and not self.clock.running:
+            self.clock.start(self.board.turn)
+            self.broadcast(self.clock_message())
+        elif not seated and self.clock.running:
+            self.clock.stop()
+            self.broadcast(self.clock_message())
+            if journal is not None and self.game_no is not None:
+                journal.record_clock(self.game_no, self.clock.milliseconds())
+        self.arm_flag_timer()
+
+    def arm_flag_timer(self):
+        """(Re)schedule the single timer that fires when the side to move runs out of time."""
+        if self.flag_timer is not None:
+            self.flag_timer.cancel()
+            self.flag_timer = None
+        deadline = self.clock.deadline()
+        if deadline is not None and not self.finished:
+            loop = asyncio.get_running_loop()
+            self.flag_timer = loop.call_later(max(0.0, deadline - time.monotonic()),
+                                              lambda: loop.create_task(self.check_flag(deadline)))
+
+    async def check_flag(self, deadline):
+        """Flag timer callback: end the game if the side to move is really out of time."""
+        async with self.lock:
+            flag_timer_lag.observe(max(0.0, time.monotonic() - deadline))
+            self.flag_timer = None
+            if self.finished or not self.clock.running:
                 return
-    elif role == 's':
-        with lock:
-            spectators.append(client_socket)
-        safe_send(client_socket, "You are a spectator")
-        print(f"{name} joined as Spectator")
-    else:
-        safe_send(client_socket, "Invalid choice")
-        client_socket.close()
-        return
+            if self.clock.time_left(self.clock.turn) > 0:
+                self.arm_flag_timer()  # Woke up a little early
+                return
+            self.flag_fell()
+
+    def flag_fell(self):
+        """The side to move ran out of time. Caller holds the lock."""
+        loser = self.clock.turn
+        self.clock.stop()
+        self.broadcast(self.clock_message())
+        self.end_game("Black wins by timeout" if loser == chess.WHITE else "White wins by timeout")
+
+    def journal_move(self, move):
+        """Append the move just pushed (and the clocks after it) to the journal."""
+        if journal is None:
+            return
+        if self.game_no is None:
+            self.game_no = journal.start_game(self.room_id, str(self.clock.time_control))
+        journal.record_move(self.game_no, move, self.clock.milliseconds())
+
+    def journal_state(self):
+        """This game as the journal would replay it, for snapshots."""
+        return JournaledGame(self.game_no, self.room_id, str(self.clock.time_control),
+                             [encode_move(m) for m in self.board.move_stack], self.clock.milliseconds())
+
+    @classmethod
+    def restore(cls, game):
+        """Rebuild an unfinished room from its journal record (players must rejoin)."""
+        room = cls(game.room_id, TimeControl.parse(game.time_control))
+        room.board = game.board()
+        room.game_no = game.game_no
+        room.recovered = True
+        room.clock.turn = room.board.turn
+        if game.clocks is not None:
+            room.clock.set_state(game.clocks, room.board.turn, running=False)
+        return room
+
+    def legal_moves(self):
+        """uci -> Move for every legal move in the current position, generated once per position."""
+        if self.legal is None:
+            self.legal = {move.uci(): move for move in self.board.generate_legal_moves()}
+        return self.legal
+
+    def legal_move(self, uci):
+        """The legal Move a client's UCI string stands for, or None.
+
+        Uses the position's move set if it has already been generated;
+        otherwise checking the one move is cheaper than generating them all.
+        """
+        if self.legal is not None:
+            return self.legal.get(uci)
+        try:
+            move = chess.Move.from_uci(uci)
+        except ValueError:
+            return None
+        return move if self.board.is_legal(move) else None
+
+    def push(self, move):
+        self.board.push(move)
+        self.legal = None
+
+    def game_result(self):
+        """'White wins', 'Black wins' or 'Draw' if the game just ended, else None.
 
+        Same outcome as board.is_game_over(), but each condition is only checked
+        when it can apply: mate and stalemate need no legal move (the cached set
+        or the first generated move answers that), and 75-move or fivefold
+        repetition draws need at least 16 reversible plies.
+        """
+        board = self.board
+        if self.legal is not None:
+            stuck = not self.legal
+        else:
+            stuck = next(board.generate_legal_moves(), None) is None
+        if stuck:
+            if board.is_check():
+                return "Black wins" if board.turn == chess.WHITE else "White wins"
+            return "Draw"
+        if board.is_insufficient_material():
+            return "Draw"
+        if board.halfmove_clock >= 16 and (board.is_seventyfive_moves() or board.is_fivefold_repetition()):
+            return "Draw"
+        return None
+
+    def legal_hint(self):
+        """'legal:<ply>:<uci> <uci> ...' for the current position."""
+        return f"legal:{self.board.ply()}:{' '.join(self.legal_moves())}"
+
+    def send_legal_hint(self):
+        """Tell the player to move which moves are legal."""
+        player = self.players['white' if self.board.turn == chess.WHITE else 'black']
+        if player is not None and not self.finished:
+            player.send(self.legal_hint())
+
+    def move_message(self, move):
+        """Delta for the move just pushed: ply number, UCI move and both clocks."""
+        return f"move:{self.board.ply()}:{move.uci()}:{self.clock.state()}"
+
+    def end_game(self, winner):
+        """Announce the result, disconnect everyone and tear the room down. Caller holds the lock."""
+        if self.finished:
+            return
+        self.finished = True
+        games_finished.inc()
+        if journal is not None and self.game_no is not None:
+            journal.record_end(self.game_no, winner)
+        if UPSTREAM is None:  # A relay's board starts from an upstream FEN; the upstream server keeps the game
+            game = archive.add(self.room_id, self.names['white'], self.names['black'], str(self.clock.time_control),
+                               winner, self.clock.milliseconds(), self.board)
+            if pgn_export is not None:
+                pgn_export.add(game)
+        self.broadcast(f"Game over: {winner}")
+        print(f"[{self.room_id}] Game over: {winner}")
+        for p in self.clients():
+            p.close()  # Flushes the pending result before closing
+        self.close()
+
+    def subscribe_eval(self, conn):
+        """Start sending evaluations to a spectator, beginning with the current position."""
+        self.eval_subscribers.add(conn)
+        if self.relay_task is not None:
+            # One upstream subscription serves every local watcher.
+            if len(self.eval_subscribers) == 1 and self.upstream is not None:
+                self.upstream.send("watch_eval")
+            elif self.upstream_eval is not None:
+                conn.send(self.upstream_eval)
+            return
+        if analysis is None:
+            return
+        entry = analysis.lookup(chess.polyglot.zobrist_hash(self.board))
+        running = self.analysis_task is not None and not self.analysis_task.done()
+        if not running and (entry is None or entry[0] < analysis.depths[-1]):
+            self.analyse_position()  # Publishes the cached entry, if any, before deepening
+        elif entry is not None:
+            # Analysis is running or already reached full depth; catch only the newcomer up from the cache.
+            conn.send(f"eval:{self.board.ply()}:{entry[1]}:{entry[0]}")
+
+    def unsubscribe_eval(self, conn):
+        self.eval_subscribers.discard(conn)
+        if not self.eval_subscribers:
+            self.stop_analysis()
+            if self.upstream is not None:
+                self.upstream.send("unwatch_eval")
+                self.upstream_eval = None
+
+    def analyse_position(self):
+        """(Re)start deepening analysis of the current position if anyone is watching it."""
+        self.stop_analysis()
+        if analysis is None or not self.eval_subscribers or self.finished:
+            return
+        self.analysis_task = asyncio.get_running_loop().create_task(
+            analysis.deepen(self, self.board.copy()))
+
+    def stop_analysis(self):
+        if self.analysis_task is not None:
+            self.analysis_task.cancel()
+            self.analysis_task = None
+
+    def publish_eval(self, message):
+        """Send an eval: message to the subscribed spectators (encoded once)."""
+        frame = protocol.encode(message)
+        for conn in self.eval_subscribers:
+            conn.send_frame(frame)
+
+    def start_relay(self):
+        """Relay mode: follow this room on the upstream server."""
+        self.relay_task = asyncio.get_running_loop().create_task(self.relay())
+
+    async def relay(self):
+        """Mirror the upstream room and re-broadcast its messages until it ends or disconnects."""
+        try:
+            self.upstream = await Upstream.open(UPSTREAM, self.room_id)
+            if self.eval_subscribers:
+                self.upstream.send("watch_eval")
+            while True:
+                message = await self.upstream.recv()
+                async with self.lock:
+                    if self.finished:
+                        break
+                    self.relay_message(message)
+        except (OSError, ConnectionError, protocol.ProtocolError) as e:
+            print(f"[{self.room_id}] Upstream lost: {e}")
+        finally:
+            if self.upstream is not None:
+                self.upstream.close()
+        async with self.lock:
+            if not self.finished:
+                for p in self.clients():
+                    p.close()
+                self.close()
+
+    def relay_message(self, message):
+        """Apply one upstream message to the mirrored board and clock and pass it on. Caller holds the lock."""
+        if message.startswith("move:"):
+            try:
+                ply, uci, clocks = protocol.parse_move(message)
+                move = chess.Move.from_uci(uci)
+            except ValueError:
+                return
+            if ply <= self.board.ply():
+                return
+            if ply != self.board.ply() + 1:
+                if not self.sync_pending:
+                    self.sync_pending = True
+                    self.upstream.send("sync")
+                return
+            running = self.clock.running
+            self.push(move)
+            self.clock.set_state(clocks, self.board.turn, running)
+            self.broadcast(message)
+        elif message.startswith("clock:"):
+            try:
+                clocks, running = protocol.parse_clock(message)
+            except ValueError:
+                return
+            turn = {'white': chess.WHITE, 'black': chess.BLACK}.get(running, self.board.turn)
+            self.clock.set_state(clocks, turn, running is not None)
+            self.broadcast(message)
+            if not self.synced:
+                # The first snapshot (FEN, then clock) is in: greet the spectators who arrived before it.
+                self.synced = True
+                for conn, name in self.joining:
+                    self.greet_spectator(conn, name)
+                self.joining = []
+        elif message.startswith("eval:"):
+            self.upstream_eval = message
+            self.publish_eval(message)
+        elif message.startswith("Game over:"):
+            self.end_game(message.split(":", 1)[1].strip())
+        elif ' ' in message and '/' in message:  # FEN snapshot
+            try:
+                self.board.set_fen(message)
+            except ValueError:
+                return
+            self.legal = None
+            self.sync_pending = False
+            self.broadcast(message)
+
+    def close(self):
+        """Disarm the timers, stop analysis, drop the sessions and remove the room from the registry."""
+        if not self.finished and journal is not None and self.game_no is not None:
+            journal.record_end(self.game_no, "abandoned")  # Everyone left; nothing to restore
+        self.finished = True
+        if self.flag_timer is not None:
+            self.flag_timer.cancel()
+            self.flag_timer = None
+        for timer in self.held.values():
+            timer.cancel()
+        self.held.clear()
+        for token in self.tokens.values():
+            sessions.pop(token, None)
+        self.stop_analysis()
+        if self.relay_task is not None:
+            self.relay_task.cancel()
+        for conn, _ in self.joining:
+            conn.close()
+        self.joining = []
+        if rooms.get(self.room_id) is self:
+            del rooms[self.room_id]
+            print(f"[{self.room_id}] Room closed")
+
+
+# Session token -> (room, color), for players resuming after a disconnect
+sessions = {}
+
+# Players waiting to be paired, and the numbers of the rooms made for them
+lobby = MatchQueue()
+match_ids = itertools.count(1)
+
+# Room registry: room id -> GameRoom. Only touched from the event loop thread,
+# so lookups need no lock; each room serialises its own game with room.lock.
+rooms = {}
+
+def get_or_create_room(room_id):
+    """Return the open room with this id, creating it if necessary."""
+    room = rooms.get(room_id)
+    if room is None or room.finished:
+        room = GameRoom(room_id)
+        rooms[room_id] = room
+        print(f"[{room_id}] Room created")
+        if UPSTREAM is not None:
+            room.start_relay()
+    return room
+
+def greet_player(room, conn, name, color):
+    """Send a newly seated player its color, the position, the clock and its session token.
+
+    Starts the clock once both seats are taken. Caller holds the lock.
+    """
+    conn.room = room
+    room.names[color] = name
+    conn.send(f"You are {color}")
+    print(f"[{room.room_id}] {name} joined as {color.capitalize()}")
     # Send initial board state
-    with lock:
-        safe_send(client_socket, board.fen())
+    conn.send(room.board.fen())
+    conn.send(room.clock_message())
+    conn.send(f"session:{room.issue_token(color)}")
+    room.update_clock()
+    if LEGAL_HINTS:
+        room.send_legal_hint()
+
+async def join_room(conn, name, room_id, role):
+    """Seat a new player or spectator in a room; returns the room, or None if the join failed."""
+    if role == 'p' and UPSTREAM is not None:
+        conn.send("This server is a relay; join as a spectator")
+        return None
+
+    if role == 's' and room_id not in rooms and UPSTREAM is None:  # A relay asks upstream instead
+        game = archive.last_in_room(room_id)
+        if game is not None:
+            # No game in progress here: show the last one that finished.
+            conn.send("You are a spectator")
+            conn.send(game.board().fen())
+            conn.send(f"clock:{game.white_ms},{game.black_ms}:-")
+            conn.send(f"Game over: {game.result}")
+            return None
+
+    room = get_or_create_room(room_id)
+
+    if role == 'p':
+        async with room.lock:
+            color = room.seat_player(conn)
+            if color is None:
+                conn.send("Game is full")
+                return None
+            greet_player(room, conn, name, color)
+    else:
+        async with room.lock:
+            conn.room = room
+            if room.relay_task is not None and not room.synced:
+                room.joining.append((conn, name))  # Greeted once the upstream snapshot arrives
+            else:
+                room.greet_spectator(conn, name)
+    return room
+
+def start_match(white, black):
+    """Open a fresh room for two paired seekers and seat them."""
+    room_id = f"match-{next(match_ids)}"
+    while room_id in rooms:  # Restored from the journal, or opened by hand
+        room_id = f"match-{next(match_ids)}"
+    room = GameRoom(room_id, white.time_control)
+    rooms[room_id] = room
+    print(f"[{room_id}] Room created for {white.name} ({white.rating}) vs {black.name} ({black.rating})")
+    for seeker in (white, black):
+        seeker.conn.send(f"Matched in room {room_id}")
+        greet_player(room, seeker.conn, seeker.name, room.seat_player(seeker.conn))
+        seeker.matched.set_result(room)
+
+async def matchmake(conn, name, seek):
+    """Wait in the lobby until paired; returns the new room, or None if the player left first.
+
+    Any message from the player while waiting (or disconnecting) takes them out of the queue.
+    """
+    rating, time_control = seek
+    loop = asyncio.get_running_loop()
+    seeker = Seeker(conn, name, rating, time_control or TIME_CONTROL, loop.create_future(), time.monotonic())
+    opponent = lobby.join(seeker)
+    if opponent is not None:
+        start_match(opponent, seeker)  # The player who waited longer gets white
+        return seeker.matched.result()
+    conn.send("Waiting for an opponent")
+    left = loop.create_task(conn.recv())
+    await asyncio.wait((seeker.matched, left), return_when=asyncio.FIRST_COMPLETED)
+    if seeker.matched.done():
+        # The read must be finished before the game loop reads from the same
+        # stream; a message that raced the pairing is kept for it. The player
+        # is seated by now, so a failed read must not escape: the game loop's
+        # own read sees the disconnect and clears or holds the seat.
+        left.cancel()
+        try:
+            message = await left
+        except (asyncio.CancelledError, ConnectionError, protocol.ProtocolError):
+            message = ""
+        if message:
+            conn.incoming.appendleft(message)
+        return seeker.matched.result()
+    lobby.leave(seeker)
+    return None
+
+async def resume_session(conn, request):
+    """Put a reconnecting player back in their seat ('resume:<token>:<last ply seen>').
+
+    Returns the room, or None if the session is unknown or its game is over.
+    """
+    try:
+        _, token, ply = request.split(":")
+        ply = int(ply)
+    except ValueError:
+        conn.send("Resume failed")
+        return None
+    room, color = sessions.get(token, (None, None))
+    if room is None:
+        conn.send("Resume failed")
+        return None
+    async with room.lock:
+        if room.finished:
+            conn.send("Resume failed")
+            return None
+        conn.room = room
+        room.reseat_player(color, conn)
+        conn.send(f"Resumed {color}")
+        print(f"[{room.room_id}] {room.names[color]} resumed as {color.capitalize()}")
+        missed = room.moves_since(ply)
+        if missed is None:
+            conn.send(room.board.fen())  # Too far behind for the buffer: full snapshot
+        else:
+            for frame in missed:
+                conn.send_frame(frame)
+        conn.send(room.clock_message())
+        room.update_clock()
+        if LEGAL_HINTS:
+            room.send_legal_hint()
+    return room
+
+async def handle_client(reader, writer):
+    """Per-connection coroutine: handshake, then apply the client's commands to its room."""
+    conn = Connection(reader, writer)
+    try:
+        # Ask for user's name (a reconnecting player answers with its session instead)
+        conn.send("Enter your name:")
+        name = await conn.recv()
+
+        if name.startswith("resume:"):
+            role = 'p'
+            room = await resume_session(conn, name)
+        else:
+            # Ask which game to join
+            conn.send("Enter room id:")
+            room_id = await conn.recv() or DEFAULT_ROOM
+
+            # Ask for role
+            conn.send("Are you a player or spectator? (p/s)")
+            role = (await conn.recv()).lower()
+            if role.startswith("m:") and UPSTREAM is None:
+                # Matchmaking: 'm:<rating>[:<time control>]' instead of a seat in room_id
+                try:
+                    seek = parse_seek(role)
+                except ValueError:
+                    seek = None
+                role = 'p'
+                if seek is None:
+                    conn.send("Invalid choice")
+                    room = None
+                else:
+                    room = await matchmake(conn, name, seek)
+            elif role not in ('p', 's'):
+                conn.send("Invalid choice")
+                room = None
+            else:
+                room = await join_room(conn, name, room_id, role)
+    except (ConnectionError, protocol.ProtocolError):
+        room = None
+    if room is None:
+        conn.close()
+        return
 
     # Handle client communication
-    while True:
+    while not room.finished:
         try:
-            message = client_socket.recv(1024).decode().strip()
+            message = await conn.recv()
             if not message:
                 break
 
-            # Handle resign
-            if message == "resign":
-                if role == 'p':
-                    if players['white'] == client_socket:
-                        winner = "Black wins by resignation"
-                    else:
-                        winner = "White wins by resignation"
-                    for p in [players['white'], players['black']] + spectators:
-                        if p:
-                            safe_send(p, f"Game over: {winner}")
-                    print(f"Game over: {winner}")
-                    os._exit(0)
-            # Handle draw offer
-            elif message == "offer_draw":
-                opponent = players['black'] if players['white'] == client_socket else players['white']
-                if opponent:
-                    safe_send(opponent, "draw_offer")
-            elif message == "accept_draw":
-                for p in [players['white'], players['black']] + spectators:
-                    if p:
-                        safe_send(p, "Game over: Draw by agreement")
-                print("Game over: Draw by agreement")
-                os._exit(0)
-            elif message == "decline_draw":
-                opponent = players['black'] if players['white'] == client_socket else players['white']
-                if opponent:
-                    safe_send(opponent, "draw_declined")
-            else:
-                # Process moves for players on turn
-                if role == 'p' and ((players['white'] == client_socket and current_turn == chess.WHITE) or
-                                    (players['black'] == client_socket and current_turn == chess.BLACK)):
-                    try:
-                        move = chess.Move.from_uci(message)
-                        with lock:
-                            if move in board.legal_moves:
-                                board.push(move)
-                                current_turn = not current_turn
-                                last_move_time = time.time()  # Reset timer on move
-                                fen = board.fen()
-                                for p in [players['white'], players['black']] + spectators:
-                                    if p:
-                                        safe_send(p, fen)
-                                if board.is_game_over():
-                                    result = board.result()
-                                    if result == "1-0":
-                                        winner = "White wins"
-                                    elif result == "0-1":
-                                        winner = "Black wins"
-                                    else:
-                                        winner = "Draw"
-                                    for p in [players['white'], players['black']] + spectators:
-                                        if p:
-                                            safe_send(p, f"Game over: {winner}")
-                                    print(f"Game over: {winner}")
-                                    os._exit(0)
-                            else:
-                                safe_send(client_socket, "Invalid move")
-                    except ValueError:
-                        safe_send(client_socket, "Invalid move")
+            async with room.lock:
+                if room.finished:
+                    break
+                handle_message(room, conn, role, message)
         except Exception:
             break
 
-    with lock:
+    async with room.lock:
+        color = room.color_of(conn)
+        room.remove(conn)
+        if color and not room.finished and room.clock.running and RESUME_GRACE > 0:
+            room.hold_seat(color)  # The clock keeps running while they reconnect
+        if not room.finished and room.is_empty():
+            room.close()
+        elif role == 'p':
+            room.update_clock()
+    conn.close()
+
+def handle_message(room, conn, role, message):
+    """Apply one client command to the room. Caller holds room.lock."""
+    color = room.color_of(conn)
+
+    # Handle resign
+    if message == "resign":
+        if role == 'p' and color:
+            winner = "Black wins by resignation" if color == 'white' else "White wins by resignation"
+            room.end_game(winner)
+    # Handle draw offer
+    elif message == "offer_draw":
+        opponent = room.opponent_of(conn)
+        if role == 'p' and opponent:
+            opponent.send("draw_offer")
+    elif message == "accept_draw":
         if role == 'p':
-            if players['white'] == client_socket:
-                players['white'] = None
-            elif players['black'] == client_socket:
-                players['black'] = None
-        elif role == 's' and client_socket in spectators:
-            spectators.remove(client_socket)
-    client_socket.close()
-
-def main():
-    server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-    server.bind(('26.235.154.238', 5555))  # Use your desired IP/port
-    server.listen(5)
-    print("Server started on port 5555")
-
-    # Start the timer thread
-    threading.Thread(target=timer_thread, daemon=True).start()
+            room.end_game("Draw by agreement")
+    elif message == "decline_draw":
+        opponent = room.opponent_of(conn)
+        if role == 'p' and opponent:
+            opponent.send("draw_declined")
+    # Spectators can ask for the shared engine evaluations
+    elif message == "watch_eval":
+        if role == 's':
+            if analysis is None and room.relay_task is None:
+                conn.send("eval:off")
+            else:
+                room.subscribe_eval(conn)
+    elif message == "unwatch_eval":
+        room.unsubscribe_eval(conn)
+    # Client missed a move delta: send a fresh snapshot
+    elif message == "sync":
+        conn.send(room.board.fen())
+        conn.send(room.clock_message())
+    else:
+        # Process moves for players on turn
+        if role == 'p' and color == ('white' if room.board.turn == chess.WHITE else 'black'):
+            start = time.perf_counter()
+            move = room.legal_move(message)
+            move_validation.observe(time.perf_counter() - start)
+            if move is not None:
+                if not room.clock.press():  # Flag fell before the move arrived
+                    room.flag_fell()
+                    return
+                room.push(move)
+                room.journal_move(move)
+                room.arm_flag_timer()
+                # Clients apply the delta to their own board; the full FEN
+                # is only sent on join and when a client asks to resync.
+                frame = room.broadcast(room.move_message(move))
+                room.recent_moves.append((room.board.ply(), frame))
+                room.analyse_position()
+                if LEGAL_HINTS:
+                    room.legal_moves()  # Generated once, for the game-over check and the hint
+                winner = room.game_result()
+                if winner is not None:
+                    room.end_game(winner)
+                elif LEGAL_HINTS:
+                    room.send_legal_hint()
+                moves_applied.inc()
+                move_latency.observe(time.perf_counter() - start)
+            else:
+                moves_rejected.inc()
+                conn.send("Invalid move")
+
+def raise_fd_limit():
+    """Lift the open-file soft limit to the hard limit so we can hold many sockets."""
+    if resource is None:
+        return
+    try:
+        soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+        if soft < hard:
+            resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+    except (ValueError, OSError):
+        pass
+
+def recover_rooms():
+    """Recreate every unfinished game found in the journal."""
+    global match_ids
+    start = time.perf_counter()
+    games = journal.recover()
+    restored = 0
+    last_match = 0
+    for game in games.values():
+        if game.result is None and game.room_id not in rooms:
+            rooms[game.room_id] = GameRoom.restore(game)
+            restored += 1
+        prefix, _, number = game.room_id.partition("match-")
+        if not prefix and number.isdigit():
+            last_match = max(last_match, int(number))
+    match_ids = itertools.count(last_match + 1)  # Lobby rooms keep numbering after the journaled ones
+    print(f"Journal: restored {restored} game(s) in progress out of {len(games)} "
+          f"in {time.perf_counter() - start:.2f}s")
+
+def live_games():
+    """Journal snapshot source: every journaled game still being played."""
+    return [room.journal_state() for room in rooms.values()
+            if room.game_no is not None and not room.finished]
+
+async def serve(host, port, stats_interval=0, metrics_address=None):
+    if journal is not None:
+        recover_rooms()
+        await journal.open(live_games)
+    if pgn_export is not None:
+        await pgn_export.open()
+    if analysis is not None:
+        await analysis.start()
+    server = await asyncio.start_server(handle_client, host, port, backlog=1024)
+    print(f"Server started on {host}:{port}")
+    if UPSTREAM is not None:
+        print(f"Relaying spectators for {UPSTREAM[0]}:{UPSTREAM[1]}")
+    if stats_interval > 0:
+        asyncio.get_running_loop().create_task(report_stats(stats_interval))
+    if metrics_address is not None:
+        await metrics.serve(*metrics_address)
+        asyncio.get_running_loop().create_task(metrics.watch_loop_lag(loop_lag))
+        print(f"Metrics on http://{metrics_address[0]}:{metrics_address[1]}/metrics")
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        if analysis is not None:
+            await analysis.stop()
+        if journal is not None:
+            await journal.close()
+        if pgn_export is not None:
+            await pgn_export.close()
 
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Multiplayer chess server")
+    parser.add_argument("--host", default="0.0.0.0", help="address to bind (default: all interfaces)")
+    parser.add_argument("--port", type=int, default=protocol.DEFAULT_PORT,
+                        help="port to listen on (default: %(default)s)")
+    parser.add_argument("--time-control", type=TimeControl.parse, default=TIME_CONTROL,
+                        help="clock for new rooms: seconds, plus +increment and/or d<delay>, "
+                             "e.g. 600, 180+2, 300d5 (default: %(default)s)")
+    parser.add_argument("--send-queue-limit", type=int, default=SEND_QUEUE_LIMIT,
+                        help="frames queued per client before it is treated as slow (default: %(default)s)")
+    parser.add_argument("--slow-consumer", choices=("snapshot", "disconnect"), default=SLOW_CONSUMER_POLICY,
+                        help="what to do with a slow client: resend the latest snapshot or disconnect it")
+    parser.add_argument("--relay", metavar="HOST:PORT", type=parse_address,
+                        help="run as a spectator relay for the game server (or relay) at HOST:PORT")
+    parser.add_argument("--engine", help="UCI engine (e.g. Stockfish) for spectator evaluations (default: off)")
+    parser.add_argument("--engine-pool", type=int, default=2, help="engine processes to run (default: %(default)s)")
+    parser.add_argument("--eval-cache", type=int, default=100000,
+                        help="positions kept in the evaluation cache (default: %(default)s)")
+    parser.add_argument("--eval-depths", default=",".join(map(str, EVAL_DEPTHS)),
+                        help="depths to deepen each position through (default: %(default)s)")
+    parser.add_argument("--legal-hints", action="store_true",
+                        help="send the player to move the list of its legal moves after every move "
+                             "(costs generating every legal move of each position: moves validate 2-3x slower, see bench_moves.py)")
+    parser.add_argument("--match-window", type=int, default=MATCH_WINDOW,
+                        help="maximum rating difference when pairing players from the lobby (default: %(default)s)")
+    parser.add_argument("--resume-grace", type=float, default=RESUME_GRACE,
+                        help="seconds a disconnected player can resume before forfeiting; "
+                             "0 pauses the clock instead (default: %(default)s)")
+    parser.add_argument("--archive-size", type=int, default=ARCHIVE_SIZE,
+                        help="finished games kept in memory for late spectators (default: %(default)s)")
+    parser.add_argument("--journal", metavar="DIR",
+                        help="journal moves and results to DIR and restore unfinished games from it on start")
+    parser.add_argument("--pgn", metavar="FILE",
+                        help="append every finished game to FILE as PGN (default: off)")
+    parser.add_argument("--commit-interval", type=float, default=COMMIT_INTERVAL,
+                        help="seconds between journal group commits (default: %(default)s)")
+    parser.add_argument("--snapshot-interval", type=float, default=SNAPSHOT_INTERVAL,
+                        help="seconds between journal snapshots (default: %(default)s)")
+    parser.add_argument("--stats-interval", type=float, default=0,
+                        help="print send-queue statistics every N seconds (default: off)")
+    parser.add_argument("--metrics-port", type=int,
+                        help="serve Prometheus metrics and the profiler on this HTTP port (default: off)")
+    parser.add_argument("--metrics-host", default="127.0.0.1",
+                        help="address for the metrics endpoint (default: %(default)s)")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    global TIME_CONTROL, SEND_QUEUE_LIMIT, SLOW_CONSUMER_POLICY, RESUME_GRACE, LEGAL_HINTS, UPSTREAM
+    global analysis, journal, archive, lobby, pgn_export
+    args = parse_args(argv)
+    archive = GameArchive(args.archive_size)
+    lobby = MatchQueue(args.match_window)
+    if args.journal:
+        journal = Journal(args.journal, args.commit_interval, args.snapshot_interval)
+    if args.pgn:
+        pgn_export = PgnExport(args.pgn)
+    if args.engine:
+        depths = [int(d) for d in args.eval_depths.split(",") if d.strip()]
+        analysis = AnalysisService(args.engine, args.engine_pool, args.eval_cache, depths)
+    TIME_CONTROL = args.time_control
+    SEND_QUEUE_LIMIT = args.send_queue_limit
+    SLOW_CONSUMER_POLICY = args.slow_consumer
+    RESUME_GRACE = args.resume_grace
+    LEGAL_HINTS = args.legal_hints
+    UPSTREAM = args.relay
+    raise_fd_limit()
     try:
-        while True:
-            client, addr = server.accept()
-            print(f"Connection from {addr}")
-            threading.Thread(target=handle_client, args=(client,), daemon=True).start()
+        metrics_address = (args.metrics_host, args.metrics_port) if args.metrics_port else None
+        asyncio.run(serve(args.host, args.port, args.stats_interval, metrics_address))
     except KeyboardInterrupt:
         print("Server shutting down.")
-    finally:
-        server.close()
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,226 @@
+"""Tournament wall: watch many live games in one window.
+
+Every game gets a single-Canvas board (see board_canvas.py); all boards share
+one sprite cache, and one network thread reads every game's socket.
+
+    python wall.py --host 127.0.0.1 --port 5555 room1 room2 room3 room4
+"""
+import argparse
+import math
+import queue
+import selectors
+import socket
+import threading
+import time
+import tkinter as tk
+
+import chess
+
+from board_canvas import BoardCanvas, shared_sprites
+from client import format_clock
+from protocol import DEFAULT_PORT, FramedSocket, ProtocolError, parse_clock, parse_move
+
+CLOCK_REDRAW_MS = 500  # Wall clocks only need to show whole seconds
+
+
+class WatchedGame:
+    """One spectated room: its connection, board state, clock state and widgets."""
+
+    def __init__(self, room_id):
+        self.room_id = room_id
+        self.conn = None
+        self.board = chess.Board()
+        self.sync_pending = False
+        self.clock_ms = (0, 0)
+        self.clock_running = None  # 'white', 'black' or None
+        self.clock_stamp = time.monotonic()
+        self.result = None  # Final status shown in the title
+        self.view = None
+        self.title = None
+        self.clock_label = None
+
+    def send(self, message):
+        try:
+            self.conn.send(message)
+        except (OSError, AttributeError):
+            pass
+
+
+class FeedThread(threading.Thread):
+    """Connects to every room as a spectator and reads all sockets from one thread."""
+
+    def __init__(self, host, port, name, games, post):
+        super().__init__(daemon=True)
+        self.host = host
+        self.port = port
+        self.name = name
+        self.games = games
+        self.post = post  # post(game, message) hands a message to the Tk thread
+
+    def handshake(self, game):
+        """Connect and run the name/room/role handshake for one game."""
+        conn = FramedSocket(socket.create_connection((self.host, self.port), timeout=10))
+        for answer in (self.name, game.room_id, 's'):
+            conn.recv()  # prompt
+            conn.send(answer)
+        conn.sock.settimeout(None)
+        game.conn = conn
+
+    def run(self):
+        selector = selectors.DefaultSelector()
+        for game in self.games:
+            try:
+                self.handshake(game)
+            except (OSError, ProtocolError) as e:
+                self.post(game, f"Error: {e}")
+                continue
+            selector.register(game.conn.sock, selectors.EVENT_READ, game)
+            # Messages that arrived together with the handshake
+            while game.conn.incoming:
+                self.post(game, game.conn.incoming.popleft())
+        while selector.get_map():
+            for key, _ in selector.select():
+                game = key.data
+                try:
+                    data = game.conn.sock.recv(65536)
+                    messages = game.conn.decoder.feed(data) if data else None
+                except (OSError, ProtocolError):
+                    messages = None
+                if messages is None:
+                    selector.unregister(key.fileobj)
+                    self.post(game, "Connection lost")
+                    continue
+                for message in messages:
+                    self.post(game, message)
+
+
+class GameWall:
+    """Lays out one board per room in a grid and keeps them in sync with the server."""
+
+    def __init__(self, root, host, port, room_ids, name="wall", columns=None, square_size=None):
+        self.root = root
+        self.root.title(f"Chess wall - {len(room_ids)} games")
+        self.games = [WatchedGame(room_id) for room_id in room_ids]
+        self.message_queue = queue.Queue()
+
+        columns = columns or math.ceil(math.sqrt(len(self.games)))
+        rows = math.ceil(len(self.games) / columns)
+        if square_size is None:
+            # Fit the whole wall on screen, leaving room for the labels under each board.
+            width = (root.winfo_screenwidth() - 40) // (columns * 8)
+            height = (root.winfo_screenheight() - 80 - rows * 50) // (rows * 8)
+            square_size = max(12, min(width, height, 60))
+
+        # Connect to the rooms and load the sprites while the boards are laid out.
+        self.root.bind("<<NetworkMessage>>", self.check_for_updates)
+        FeedThread(host, port, name, self.games, self.post).start()
+        shared_sprites().preload(square_size)
+
+        for index, game in enumerate(self.games):
+            frame = tk.Frame(root, padx=4, pady=4)
+            frame.grid(row=index // columns, column=index % columns)
+            game.title = tk.Label(frame, text=game.room_id, font=("Helvetica", 10, "bold"))
+            game.title.pack()
+            game.view = BoardCanvas(frame, square_size=square_size)
+            game.view.canvas.pack()
+            game.view.set_position(game.board)
+            game.clock_label = tk.Label(frame, text="", font=("Helvetica", 10))
+            game.clock_label.pack()
+
+        self.root.after(CLOCK_REDRAW_MS, self.tick_clocks)
+
+    def post(self, game, message):
+        """Queue a message for the Tk thread and wake it (called from the feed thread)."""
+        self.message_queue.put((game, message))
+        try:
+            self.root.event_generate("<<NetworkMessage>>", when="tail")
+        except (tk.TclError, RuntimeError):
+            pass
+
+    def check_for_updates(self, event=None):
+        while not self.message_queue.empty():
+            game, message = self.message_queue.get()
+            self.handle(game, message)
+
+    def handle(self, game, message):
+        if message.startswith("move:"):
+            try:
+                ply, uci, clocks = parse_move(message)
+                move = chess.Move.from_uci(uci)
+            except ValueError:
+                return
+            if ply <= game.board.ply():
+                return
+            if ply != game.board.ply() + 1:
+                if not game.sync_pending:
+                    game.sync_pending = True
+                    game.send("sync")
+                return
+            game.board.push(move)
+            game.view.set_position(game.board)
+            # After a move the clock of the new side to move runs (unless the game is paused).
+            running = 'white' if game.board.turn == chess.WHITE else 'black'
+            self.set_clock(game, clocks, running if game.clock_running is not None else None)
+        elif message.startswith("clock:"):
+            try:
+                clocks, running = parse_clock(message)
+            except ValueError:
+                return
+            self.set_clock(game, clocks, running)
+        elif message.startswith("Game over:"):
+            self.finish(game, message.split(':', 1)[1].strip())
+        elif ' ' in message and '/' in message:  # FEN snapshot
+            try:
+                game.board.set_fen(message)
+            except ValueError:
+                return
+            game.sync_pending = False
+            game.view.set_position(game.board)
+        elif message == "Connection lost" or message.startswith("Error:"):
+            if game.result is None:
+                self.finish(game, message)
+
+    def finish(self, game, result):
+        game.result = result
+        game.clock_running = None
+        game.title.config(text=f"{game.room_id} - {result}")
+
+    def set_clock(self, game, clocks, running):
+        game.clock_ms = clocks
+        game.clock_running = running
+        game.clock_stamp = time.monotonic()
+        self.draw_clock(game)
+
+    def draw_clock(self, game):
+        white_ms, black_ms = game.clock_ms
+        elapsed_ms = int((time.monotonic() - game.clock_stamp) * 1000)
+        if game.clock_running == 'white':
+            white_ms -= elapsed_ms
+        elif game.clock_running == 'black':
+            black_ms -= elapsed_ms
+        game.clock_label.config(text=f"{format_clock(white_ms)}  -  {format_clock(black_ms)}")
+
+    def tick_clocks(self):
+        """Redraw the clocks that are running; stopped clocks are left alone."""
+        for game in self.games:
+            if game.clock_running is not None:
+                self.draw_clock(game)
+        self.root.after(CLOCK_REDRAW_MS, self.tick_clocks)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Watch many live games in one window")
+    parser.add_argument("rooms", nargs="+", help="room ids to watch")
+    parser.add_argument("--host", default="127.0.0.1", help="server address")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help="server port")
+    parser.add_argument("--name", default="wall", help="spectator name sent to the server")
+    parser.add_argument("--columns", type=int, help="boards per row (default: square grid)")
+    parser.add_argument("--square-size", type=int, help="pixels per square (default: fit the screen)")
+    args = parser.parse_args()
+
+    root = tk.Tk()
+    GameWall(root, args.host, args.port, args.rooms, args.name, args.columns, args.square_size)
+    root.mainloop()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,5 @@
+"""The server and client modules are flat scripts in src/; make them importable."""
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
@@ -0,0 +1,62 @@
+import chess
+import pytest
+
+from clock import GameClock, TimeControl
+
+
+def test_time_control_parse():
+    tc = TimeControl.parse("300+2d1")
+    assert (tc.base, tc.increment, tc.delay) == (300, 2, 1)
+    assert str(tc) == "300+2d1"
+    assert TimeControl.parse("600") == TimeControl(600)
+    for text in ("", "abc", "0", "+2"):
+        with pytest.raises(ValueError):
+            TimeControl.parse(text)
+
+def test_press_charges_the_mover_and_switches_sides():
+    clock = GameClock(TimeControl(60))
+    clock.start(chess.WHITE, now=100.0)
+    assert clock.press(now=105.0)
+    assert clock.turn == chess.BLACK
+    assert clock.time_left(chess.WHITE, now=200.0) == 55
+    assert clock.time_left(chess.BLACK, now=107.0) == 58
+
+def test_press_adds_the_increment():
+    clock = GameClock(TimeControl(60, increment=2))
+    clock.start(chess.WHITE, now=0.0)
+    assert clock.press(now=5.0)
+    assert clock.remaining[chess.WHITE] == 57
+
+def test_delay_is_free_thinking_time():
+    clock = GameClock(TimeControl(60, delay=3))
+    clock.start(chess.WHITE, now=0.0)
+    assert clock.time_left(chess.WHITE, now=2.0) == 60
+    assert clock.press(now=5.0)
+    assert clock.remaining[chess.WHITE] == 58
+    assert clock.deadline() == 5.0 + 3 + 60
+
+def test_flag_falls():
+    clock = GameClock(TimeControl(10, increment=5))
+    clock.start(chess.WHITE, now=0.0)
+    assert clock.deadline() == 10.0
+    assert not clock.press(now=10.5)  # Too late: no increment, clock stopped
+    assert not clock.running
+    assert clock.remaining[chess.WHITE] == 0
+    assert clock.turn == chess.WHITE
+
+def test_stop_and_resume():
+    clock = GameClock(TimeControl(60))
+    clock.start(chess.WHITE, now=0.0)
+    clock.stop(now=10.0)
+    assert not clock.running and clock.deadline() is None
+    assert clock.time_left(chess.WHITE, now=1000.0) == 50
+    clock.start(chess.WHITE, now=1000.0)
+    assert clock.deadline() == 1050.0
+
+def test_set_state_and_milliseconds():
+    clock = GameClock(TimeControl(60))
+    clock.set_state((30000, 45500), chess.BLACK, True, now=0.0)
+    assert clock.milliseconds(now=0.5) == (30000, 45000)
+    assert clock.state(now=0.5) == "30000,45000"
+    clock.set_state((30000, 45500), chess.BLACK, False)
+    assert clock.milliseconds() == (30000, 45500)
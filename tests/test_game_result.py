@@ -0,0 +1,57 @@
+import random
+
+import chess
+import pytest
+
+from server import GameRoom
+
+
+def room_at(fen):
+    room = GameRoom("test")
+    room.board = chess.Board(fen)
+    return room
+
+
+@pytest.mark.parametrize("fen, result", [
+    ("rnb1kbnr/pppp1ppp/8/4p3/6Pq/5P2/PPPPP2P/RNBQKBNR w KQkq - 1 3", "Black wins"),  # Fool's mate
+    ("7k/5Q2/6K1/8/8/8/8/8 b - - 0 1", "Draw"),  # Stalemate
+    ("8/8/4k3/8/8/3NK3/8/8 w - - 0 1", "Draw"),  # Insufficient material
+    ("8/8/4k3/8/8/3QK3/8/8 w - - 150 120", "Draw"),  # 75-move rule
+    ("rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1", None),
+])
+def test_endings(fen, result):
+    assert room_at(fen).game_result() == result
+
+@pytest.mark.parametrize("hints", [False, True])
+def test_matches_is_game_over_in_random_games(hints):
+    rng = random.Random(7)
+    for _ in range(40):
+        room = GameRoom("test")
+        while True:
+            if hints:
+                room.legal_moves()
+            over = room.board.is_game_over()
+            assert (room.game_result() is not None) == over
+            if over:
+                break
+            move = room.legal_move(rng.choice(list(room.board.legal_moves)).uci())
+            assert move is not None
+            room.push(move)
+
+def test_fivefold_repetition():
+    room = GameRoom("test")
+    for _ in range(4):
+        for uci in ("g1f3", "g8f6", "f3g1", "f6g8"):
+            assert room.game_result() is None
+            room.push(room.legal_move(uci))
+    assert room.game_result() == "Draw"
+    assert room.board.is_fivefold_repetition()
+
+def test_legal_move_rejects_illegal_and_malformed_input():
+    room = GameRoom("test")
+    for hints in (False, True):
+        if hints:
+            room.legal_moves()
+        assert room.legal_move("e2e5") is None
+        assert room.legal_move("nonsense") is None
+        assert room.legal_move("e2e4") == chess.Move.from_uci("e2e4")
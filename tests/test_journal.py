@@ -0,0 +1,99 @@
+import asyncio
+import os
+
+import chess
+
+import journal
+import server
+from journal import Journal, JournaledGame, replay
+
+
+def record_game(game_no, room_id, ucis, clocks=(600000, 600000)):
+    data = journal.start_record(game_no, room_id, "600")
+    for uci in ucis:
+        data += journal.move_record(game_no, journal.encode_move(chess.Move.from_uci(uci)), clocks)
+    return data
+
+
+def test_move_encoding_round_trip():
+    for uci in ("e2e4", "g1f3", "e7e8q", "a2a1n", "h7h8r"):
+        move = chess.Move.from_uci(uci)
+        assert journal.decode_move(journal.encode_move(move)) == move
+
+def test_replay():
+    data = record_game(1, "r1", ["e2e4", "e7e5"], (599000, 598000)) + record_game(2, "r2", ["d2d4"])
+    data += journal.clock_record(2, (1000, 2000)) + journal.end_record(1, "White wins")
+    games = {}
+    assert replay(data, games) == len(data)
+    assert games[1].result == "White wins"
+    assert games[1].board().fen() == "rnbqkbnr/pppp1ppp/8/4p3/4P3/8/PPPP1PPP/RNBQKBNR w KQkq - 0 2"
+    assert games[1].clocks == (599000, 598000)
+    assert games[2].result is None and games[2].clocks == (1000, 2000)
+
+def test_replay_stops_at_a_torn_tail():
+    data = record_game(1, "r1", ["e2e4", "e7e5"])
+    whole = len(record_game(1, "r1", ["e2e4"]))
+    for cut in range(whole, len(data)):
+        games = {}
+        assert replay(data[:cut], games) == whole
+        assert games[1].moves == [journal.encode_move(chess.Move.from_uci("e2e4"))]
+
+def test_replay_stops_at_a_corrupt_record():
+    good = record_game(1, "r1", ["e2e4"])
+    bad = bytearray(journal.move_record(1, 0, (1, 2)))
+    bad[-1] ^= 0xff
+    games = {}
+    assert replay(good + bytes(bad) + journal.end_record(1, "Draw"), games) == len(good)
+    assert games[1].result is None and len(games[1].moves) == 1
+
+def test_recover_ignores_a_torn_segment_tail(tmp_path):
+    with open(tmp_path / "journal-00000001.log", "wb") as f:
+        f.write(record_game(1, "r1", ["e2e4", "e7e5"])[:-3])
+    j = Journal(str(tmp_path))
+    games = j.recover()
+    assert len(games[1].moves) == 1
+    assert j.next_game_no == 2 and j.sequence == 1
+
+def test_snapshot_rotation(tmp_path):
+    live = {}  # What the server's rooms would report
+
+    async def run():
+        j = Journal(str(tmp_path), snapshot_interval=0)
+        j.recover()
+        await j.open(lambda: [g for g in live.values() if g.result is None])
+        first = j.start_game("r1", "600")
+        second = j.start_game("r2", "600")
+        live[first] = JournaledGame(first, "r1", "600")
+        live[second] = JournaledGame(second, "r2", "600")
+        for game_no, uci in ((first, "e2e4"), (second, "d2d4"), (first, "e7e5")):
+            move = chess.Move.from_uci(uci)
+            j.record_move(game_no, move, (590000, 600000))
+            live[game_no].moves.append(journal.encode_move(move))
+        j.record_end(second, "Black wins")
+        live[second].result = "Black wins"
+        await j.commit()
+        await j.snapshot()  # Only r1 is still in progress
+        j.record_move(first, chess.Move.from_uci("g1f3"), (580000, 590000))
+        await j.close()
+        return first
+
+    first = asyncio.run(run())
+    # The second snapshot superseded the first one and its segment
+    assert sorted(os.listdir(tmp_path)) == ["journal-00000002.log", "snapshot-00000002.bin"]
+    games = Journal(str(tmp_path)).recover()
+    assert list(games) == [first]
+    assert games[first].board().fen() == chess.Board(
+        "rnbqkbnr/pppp1ppp/8/4p3/4P3/5N2/PPPP1PPP/RNBQKB1R b KQkq - 1 2").fen()
+    assert games[first].clocks == (580000, 590000)
+
+def test_restored_room_keeps_its_position_and_clocks():
+    game = JournaledGame(7, "r1", "300+2", [journal.encode_move(chess.Move.from_uci("e2e4"))], (250000, 299000))
+    room = server.GameRoom.restore(game)
+    assert room.recovered and room.game_no == 7
+    assert room.board.move_stack == [chess.Move.from_uci("e2e4")]
+    assert str(room.clock.time_control) == "300+2"
+    assert not room.clock.running
+    assert room.clock.turn == chess.BLACK
+    assert room.clock.milliseconds() == (250000, 299000)
+    state = room.journal_state()
+    assert (state.game_no, state.moves, state.clocks) == (7, game.moves, (250000, 299000))
@@ -0,0 +1,53 @@
+import pytest
+
+from clock import TimeControl
+from lobby import BUCKET_WIDTH, MatchQueue, Seeker, parse_seek
+
+BLITZ = TimeControl(180, 2)
+RAPID = TimeControl(600)
+
+
+def seeker(name, rating, time_control=BLITZ):
+    return Seeker(None, name, rating, time_control, None, 0.0)
+
+
+def test_parse_seek():
+    assert parse_seek("m:1500") == (1500, None)
+    assert parse_seek("m:1500:180+2") == (1500, BLITZ)
+    for text in ("m", "m:abc", "m:-5", "p:1500", "m:1500:180:2"):
+        with pytest.raises(ValueError):
+            parse_seek(text)
+
+def test_pairs_within_the_rating_window():
+    queue = MatchQueue(window=100)
+    low, high = seeker("low", 1500), seeker("high", 1650)
+    assert queue.join(high) is None
+    assert queue.join(low) is None  # 150 points apart
+    assert queue.join(seeker("near low", 1510)) is low
+    assert queue.join(seeker("near high", 1640)) is high
+    assert queue.waiting == 0
+    assert queue.stats['pairs'] == 2
+
+def test_pairs_in_the_same_bucket():
+    queue = MatchQueue(window=200)
+    old, young = seeker("old", 1500), seeker("young", 1500)
+    assert queue.join(old) is None
+    assert queue.join(young) is old
+    assert queue.waiting == 0
+
+def test_time_controls_and_window_keep_seekers_apart():
+    queue = MatchQueue(window=100)
+    assert queue.join(seeker("blitz", 1500)) is None
+    assert queue.join(seeker("rapid", 1500, RAPID)) is None
+    assert queue.join(seeker("strong", 1500 + 100 + 2 * BUCKET_WIDTH)) is None
+    assert queue.waiting == 3
+
+def test_leave():
+    queue = MatchQueue()
+    waiting = seeker("waiting", 1500)
+    queue.join(waiting)
+    queue.leave(waiting)
+    queue.leave(waiting)  # Leaving twice is harmless
+    assert queue.waiting == 0 and not queue.buckets
+    assert queue.stats['leaves'] == 1
+    assert queue.join(seeker("late", 1500)) is None
@@ -0,0 +1,52 @@
+import pytest
+
+import protocol
+from protocol import FrameDecoder, ProtocolError
+
+
+def test_messages_split_across_reads():
+    decoder = FrameDecoder()
+    assert decoder.feed(b"e2") == []
+    assert decoder.feed(b"e4\nmove:1:e") == ["e2e4"]
+    assert decoder.feed(b"2e4:1,2\n") == ["move:1:e2e4:1,2"]
+
+def test_several_messages_in_one_read():
+    decoder = FrameDecoder()
+    assert decoder.feed(b"a\nb\n\nc\nd") == ["a", "b", "c"]  # Blank lines are dropped
+    assert decoder.feed(b"\n") == ["d"]
+
+def test_every_split_point_gives_the_same_messages():
+    data = protocol.encode("You are white") + protocol.encode("clock:600000,600000:-")
+    for cut in range(len(data) + 1):
+        decoder = FrameDecoder()
+        assert decoder.feed(data[:cut]) + decoder.feed(data[cut:]) == ["You are white", "clock:600000,600000:-"]
+
+def test_encode_keeps_one_message_on_one_line():
+    assert protocol.encode("a\nb") == b"a b\n"
+
+def test_partial_line_over_the_limit():
+    decoder = FrameDecoder(max_frame=8)
+    with pytest.raises(ProtocolError):
+        decoder.feed(b"123456789")
+
+def test_line_completed_over_the_limit():
+    decoder = FrameDecoder(max_frame=8)
+    assert decoder.feed(b"12345678") == []
+    with pytest.raises(ProtocolError):
+        decoder.feed(b"1234567\n")
+
+def test_line_at_the_limit():
+    decoder = FrameDecoder(max_frame=8)
+    assert decoder.feed(b"1234") == []
+    assert decoder.feed(b"5678\n") == ["12345678"]
+
+def test_invalid_utf8():
+    with pytest.raises(ProtocolError):
+        FrameDecoder().feed(b"\xff\xfe\n")
+
+def test_parse_move_and_clock():
+    assert protocol.parse_move("move:3:g1f3:599000,598500") == (3, "g1f3", (599000, 598500))
+    assert protocol.parse_clock("clock:1000,2000:black") == ((1000, 2000), "black")
+    assert protocol.parse_clock("clock:1000,2000:-") == ((1000, 2000), None)
+    with pytest.raises(ValueError):
+        protocol.parse_move("move:x:e2e4:1,2")